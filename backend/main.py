@@ -1,49 +1,113 @@
+import json
 import os
 import shutil
 import tempfile
+import threading
+from contextlib import asynccontextmanager
 from pathlib import Path
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 from uuid import uuid4
 
 from fastapi import (
+    BackgroundTasks,
     FastAPI,
+    Query,
     UploadFile,
     HTTPException,
     status,
     Request,
 )
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from redis import Redis
-
-from src.analysis.emo_llama import analyze_prompt_with_emo_llama
-from src.api.config import get_logger
+from fastapi.responses import (
+    FileResponse,
+    JSONResponse,
+    Response,
+    StreamingResponse,
+)
+from redis.exceptions import RedisError
+from starlette.background import BackgroundTask
+from rq.exceptions import NoSuchJobError
+from rq.job import Job, JobStatus
+
+from src.analysis.emo_llama import stream_prompt_with_emo_llama
+from src.analysis.model_cache import model_cache
+from src.api.config import LLM_WARMUP, get_logger
 from src.minio import MinioClient
 from src.mongodb import (
+    VIDEO_SUMMARY_PROJECTION,
+    build_videos_filter,
     emotion_detection_collection,
-    openai_analysis_collection,
+    SEGMENT_OPTIONAL_FIELDS,
     check_record_exists,
+    find_segments_in_range,
+    find_videos_page,
+    get_item,
+    load_segment_documents_for_videos,
 )
 from src.api.schemas import (
     EmotionModel,
     Error,
+    ExportFormat,
     EmotionDetectionItem,
     VideosResponse,
     VideoError,
+    FINAL_VIDEO_STAGE,
+    VideoStage,
+    VideoStatus,
+    VideoSummary,
+    VideoView,
     UploadedVideoResponse,
     OpenAIAnalysisItem,
+    JobStatusResponse,
+    SegmentsResponse,
+    AnalyticsResponse,
+    VideoRollup,
 )
 from src.analysis.pipelines import trigger_video_processing
-from src.analysis.gpt2 import analyze_prompt_with_gpt2
+from src.analysis.gpt2 import stream_prompt_with_gpt2
+from src.analysis.summary_cache import find_cached_summary
 from src.api.exceptions import APIError
-from src.analysis.prompt import build_condition_messages
-from src.analysis.openai import make_request_to_openai
+from src.api.sse import (
+    SSE_HEADERS,
+    SSE_KEEPALIVE,
+    SSE_KEEPALIVE_SECONDS,
+    format_sse,
+)
+from src.analysis.prompt import OPENAI_PROMPT, build_condition_prompt
+from src.analysis.openai import find_openai_analysis
+from src.summary_tasks import enqueue_summary
+from src.export import MEDIA_TYPES, build_export_query, write_segments
+from src.analytics import get_daily_rollups, get_video_rollup
+from src.cleanup import delete_video_artifacts
+from src.progress import (
+    FAILED,
+    FINISHED,
+    TERMINAL_STEPS,
+    progress_percent,
+    video_channel,
+)
+from src.redis_client import async_redis_conn, redis_conn
+from src.response_cache import (
+    cache_video,
+    get_cached_video,
+    get_generation,
+    make_etag,
+)
 
 logger = get_logger()
 minio = MinioClient()
-redis = Redis(host="localhost", port=6379)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if LLM_WARMUP:
+        logger.info(f"Warming up models: {LLM_WARMUP}")
+        await run_in_threadpool(model_cache.warm_up, LLM_WARMUP)
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -64,20 +128,225 @@ def healthcheck():
     return {"status": "online"}
 
 
-@app.get("/videos", response_model=VideosResponse)
-def list_videos():
-    items = list(emotion_detection_collection.find())
-    if not items:
+@app.get("/videos", response_model=None, responses={200: {"model": VideosResponse}})
+def list_videos(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
+    video_status: VideoStatus | None = Query(None, alias="status"),
+    stage: VideoStage | None = None,
+    view: VideoView = VideoView.SUMMARY,
+    include_total: bool = False,
+) -> VideosResponse:
+    """
+    List videos newest first, `limit` per page. Pass the returned
+    `next_cursor` back as `cursor` for the next page. The default summary
+    view leaves out the transcript and emotion chunks; fetch a single video
+    for those, or use view=full.
+    """
+    query = build_videos_filter(video_status, stage)
+    projection = VIDEO_SUMMARY_PROJECTION if view == VideoView.SUMMARY else None
+    try:
+        docs, next_cursor = find_videos_page(query, limit, cursor, projection)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    if not docs and cursor is None and not query:
         raise HTTPException(404, "No videos found.")
-    return {"videos": items, "total": len(items)}
 
+    if view == VideoView.FULL:
+        segments = load_segment_documents_for_videos([doc["_id"] for doc in docs])
+        for doc in docs:
+            if doc["_id"] in segments:
+                doc["emotion_chunks"] = segments[doc["_id"]]
+
+    schema = VideoSummary if view == VideoView.SUMMARY else EmotionDetectionItem
+    return VideosResponse(
+        videos=[schema.model_validate(doc) for doc in docs],
+        next_cursor=next_cursor,
+        total=(
+            emotion_detection_collection.count_documents(query)
+            if include_total
+            else None
+        ),
+    )
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
 
-@app.get("/videos/{video_id}", response_model=EmotionDetectionItem)
-def get_video(video_id: str):
-    item = emotion_detection_collection.find_one({"_id": video_id})
-    if not item:
+
+@app.get(
+    "/videos/{video_id}",
+    response_model=EmotionDetectionItem,
+    responses={304: {"description": "Not modified since the given ETag"}},
+)
+def get_video(video_id: str, request: Request):
+    """
+    Get the full video record. Responses are cached in Redis until the video
+    is next written and carry an ETag; send it back in If-None-Match to get
+    304 while nothing has changed.
+    """
+    try:
+        generation = get_generation(video_id)
+        cached = get_cached_video(video_id, generation)
+    except RedisError:
+        logger.exception(f"[{video_id}]: response cache unavailable")
+        generation, cached = None, None
+
+    if cached:
+        etag, body = cached
+    else:
+        edi = get_item(video_id)
+        if not edi:
+            raise HTTPException(404, "Video not found.")
+        body = edi.model_dump_json().encode()
+        etag = make_etag(body)
+        if generation is not None:
+            try:
+                cache_video(video_id, generation, body)
+            except RedisError:
+                logger.exception(f"[{video_id}]: could not cache response")
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get(
+    "/videos/{video_id}/segments",
+    response_model=SegmentsResponse,
+    response_model_exclude_none=True,
+)
+def get_video_segments(
+    video_id: str,
+    start: float | None = Query(None, ge=0),
+    end: float | None = Query(None, ge=0),
+    fields: str | None = None,
+):
+    """
+    Emotion segments overlapping [start, end) seconds. Only timestamp, text
+    and emotion are returned unless `fields` names extra ones, comma
+    separated: vad_score, face_emotions, audio_chunk_file_path.
+    """
+    if start is not None and end is not None and end <= start:
+        raise HTTPException(400, "end must be greater than start.")
+    extra = tuple(f.strip() for f in fields.split(",") if f.strip()) if fields else ()
+    unknown = set(extra) - set(SEGMENT_OPTIONAL_FIELDS)
+    if unknown:
+        raise HTTPException(
+            400, f"Unknown segment fields: {', '.join(sorted(unknown))}"
+        )
+
+    segments = find_segments_in_range(video_id, start, end, extra)
+    if segments is None:
         raise HTTPException(404, "Video not found.")
-    return item
+    return {"video_id": video_id, "start": start, "end": end, "segments": segments}
+
+
+@app.get("/analytics", response_model=AnalyticsResponse)
+def get_analytics(start: date | None = None, end: date | None = None):
+    """
+    Per-day emotion distribution, VAD and face averages for videos uploaded
+    between `start` and `end` (inclusive), read from precomputed rollups.
+    """
+    days, totals = get_daily_rollups(start, end)
+    return AnalyticsResponse(days=days, totals=totals)
+
+
+@app.get("/analytics/videos/{video_id}", response_model=VideoRollup)
+def get_video_analytics(video_id: str):
+    rollup = get_video_rollup(video_id)
+    if not rollup:
+        raise HTTPException(404, "No rollup for this video yet.")
+    return rollup
+
+
+@app.get("/export/segments", response_class=FileResponse)
+def export_segments(
+    format: ExportFormat = ExportFormat.PARQUET,
+    video_status: VideoStatus | None = Query(None, alias="status"),
+    stage: VideoStage | None = None,
+    video_id: list[str] | None = Query(None),
+):
+    """
+    Export the segments of the matching videos as one Parquet or Arrow IPC
+    file. It is written batch by batch to a temporary file, then streamed.
+    """
+    query = build_export_query(video_status, stage, video_id)
+    suffix = f".{format}"
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        tmp_path = tmp.name
+    try:
+        write_segments(tmp_path, query, format)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    return FileResponse(
+        tmp_path,
+        media_type=MEDIA_TYPES[format],
+        filename=f"segments{suffix}",
+        background=BackgroundTask(os.remove, tmp_path),
+    )
+
+
+@app.get("/videos/{video_id}/events")
+async def stream_video_events(video_id: str):
+    """
+    Server-Sent Events for the video's pipeline. The first `progress` event
+    replays the stage stored on the record; later ones relay the updates
+    published on the `video:{id}` channel. The stream ends with a `finished`
+    or `failed` event.
+    """
+    pubsub = async_redis_conn.pubsub()
+    # Subscribe before reading the record so no update falls in between.
+    await pubsub.subscribe(video_channel(video_id))
+    try:
+        edi = await run_in_threadpool(get_item, video_id, False)
+    except BaseException:
+        await pubsub.aclose()
+        raise
+    if not edi:
+        await pubsub.aclose()
+        raise HTTPException(404, "Video not found.")
+    stage = edi.current_stage()
+
+    async def events():
+        try:
+            yield format_sse(
+                "progress",
+                {"step": stage, "stage": stage, "percent": progress_percent(stage)},
+            )
+            if edi.processing_failed_at:
+                yield format_sse(
+                    FAILED, {"step": FAILED, "error": edi.processing_error}
+                )
+                return
+            if edi.processing_finished_at or stage == FINAL_VIDEO_STAGE:
+                yield format_sse(
+                    FINISHED, {"step": FINISHED, "stage": stage, "percent": 100.0}
+                )
+                return
+            while True:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=SSE_KEEPALIVE_SECONDS
+                )
+                if message is None:
+                    yield SSE_KEEPALIVE
+                    continue
+                payload = json.loads(message["data"])
+                if payload.get("step") in TERMINAL_STEPS:
+                    yield format_sse(payload["step"], payload)
+                    return
+                yield format_sse("progress", payload)
+        finally:
+            await pubsub.aclose()
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers=SSE_HEADERS
+    )
 
 
 @app.post(
@@ -143,76 +412,127 @@ def upload_video(file: UploadFile):
     return {**edi.model_dump(), "extract_job_id": job_id}
 
 
-@app.delete("/videos/{video_id}", status_code=204)
-def delete_video(video_id: str):
-    record = emotion_detection_collection.find_one({"_id": video_id})
-    edi = EmotionDetectionItem.model_validate(record)
-    if not edi:
+@app.delete("/videos/{video_id}", status_code=status.HTTP_202_ACCEPTED)
+def delete_video(video_id: str, background_tasks: BackgroundTasks):
+    """
+    Delete the video, its stored objects and every derived record. The
+    work runs after the response, which is 202.
+    """
+    if not emotion_detection_collection.count_documents({"_id": video_id}):
         raise HTTPException(404, "Video not found.")
-    emotion_chunks = edi.emotion_chunks
-    if emotion_chunks:
-        logger.warning(f"[{video_id}] No emotion chunks to delete.")
-        keys = [
-            chunk.audio_chunk_file_path
-            for chunk in emotion_chunks
-            if chunk.audio_chunk_file_path
-        ]
-        keys.append(edi.audio_object_path)
-        if not keys:
-            logger.warning(f"[{video_id}] No valid audio chunk filenames to delete.")
-        for key in filter(None, keys):
-            minio.s3.delete_object(Bucket=minio.bucket_name, Key=key)
-
-    emotion_detection_collection.delete_one({"_id": video_id})
-    return {"message": "Video deleted successfully."}
-
-
-@app.get("/videos/{video_id}/openai")
-def get_analysis_from_openai(video_id: str):
-    """Get OpenAI analysis for the video."""
-    analysis_item = openai_analysis_collection.find_one({"video_id": video_id})
-    if analysis_item:
-        return OpenAIAnalysisItem.model_validate(analysis_item)
-    else:
-        item = emotion_detection_collection.find_one({"_id": video_id})
-        if not item:
-            raise HTTPException(404, "Video not found.")
+    background_tasks.add_task(delete_video_artifacts, video_id)
+    return {"message": "Video deletion started."}
 
-        edi = EmotionDetectionItem.model_validate(item)
-        segments = edi.emotion_chunks
-        if not segments:
-            raise HTTPException(400, "No emotion segments found for this video.")
 
-        base_prompt = build_condition_messages(segments)
-        response_content = make_request_to_openai(base_prompt)
+def summary_job_accepted(job) -> JSONResponse:
+    payload = JobStatusResponse(job_id=job.id, status=job.get_status())
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content=payload.model_dump(),
+        headers={"Location": f"/jobs/{job.id}"},
+    )
 
-        oai = OpenAIAnalysisItem(
-            video_id=video_id,
-            prompt=base_prompt,
-            analysis=response_content,
-        )
-        openai_analysis_collection.insert_one(oai.as_document())
 
-        return oai
+@app.get(
+    "/videos/{video_id}/openai",
+    response_model=OpenAIAnalysisItem,
+    responses={202: {"model": JobStatusResponse}},
+)
+def get_analysis_from_openai(video_id: str):
+    """
+    Get OpenAI analysis for the video. If it has not been generated yet, a
+    job is enqueued and 202 is returned with its id; poll /jobs/{job_id}.
+    """
+    analysis = find_openai_analysis(video_id)
+    if analysis:
+        return analysis
+
+    if not emotion_detection_collection.count_documents({"_id": video_id}):
+        raise HTTPException(404, "Video not found.")
+    return summary_job_accepted(enqueue_summary(video_id, OPENAI_PROMPT))
 
 
-@app.get("/videos/{video_id}/{model_name}")
+@app.get(
+    "/videos/{video_id}/{model_name}",
+    responses={202: {"model": JobStatusResponse}},
+)
 def get_video_emotion_prompt(video_id: str, model_name: EmotionModel):
-    item = emotion_detection_collection.find_one({"_id": video_id})
-    if not item:
+    """
+    Get the model's summary for the video. Cached summaries are returned
+    directly; otherwise a job is enqueued and 202 is returned with its id.
+    """
+    edi = get_item(video_id)
+    if not edi:
         raise HTTPException(404, "Video not found.")
 
-    edi = EmotionDetectionItem.model_validate(item)
-    base_prompt = build_condition_messages(edi.transcription_result)
-    if model_name == EmotionModel.GPT2:
-        return {
-            "model": EmotionModel.GPT2,
-            "prompt": base_prompt,
-            "summary": analyze_prompt_with_gpt2(base_prompt),
-        }
-    elif model_name == EmotionModel.EMO_LLAMA:
+    if not edi.emotion_chunks:
+        raise HTTPException(400, "No emotion segments found for this video.")
+
+    summary = find_cached_summary(video_id, model_name, edi.emotion_chunks)
+    if summary:
         return {
-            "model": EmotionModel.EMO_LLAMA,
-            "prompt": base_prompt,
-            "summary": analyze_prompt_with_emo_llama(base_prompt),
+            "model": model_name,
+            "prompt": summary.prompt,
+            "summary": summary.summary,
+            "cached": True,
         }
+    return summary_job_accepted(enqueue_summary(video_id, model_name))
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+def get_job_status(job_id: str):
+    try:
+        job = Job.fetch(job_id, connection=redis_conn)
+    except NoSuchJobError:
+        raise HTTPException(404, "Job not found.")
+
+    job_status = job.get_status()
+    error = None
+    if job_status == JobStatus.FAILED:
+        latest = job.latest_result()
+        exc_string = latest.exc_string if latest else None
+        error = exc_string.strip().splitlines()[-1] if exc_string else "Job failed."
+    return JobStatusResponse(
+        job_id=job.id,
+        status=job_status,
+        step=job.meta.get("step"),
+        result=job.return_value() if job_status == JobStatus.FINISHED else None,
+        error=error,
+    )
+
+
+@app.get("/videos/{video_id}/{model_name}/stream")
+async def stream_video_emotion_prompt(video_id: str, model_name: EmotionModel):
+    """
+    Stream the model's summary as Server-Sent Events: one `token` event per
+    decoded chunk of text, then a final `done` event. Generation runs on a
+    worker thread and stops when the client disconnects.
+    """
+    edi = await run_in_threadpool(get_item, video_id)
+    if not edi:
+        raise HTTPException(404, "Video not found.")
+
+    if not edi.emotion_chunks:
+        raise HTTPException(400, "No emotion segments found for this video.")
+
+    base_prompt = await run_in_threadpool(
+        build_condition_prompt, edi.emotion_chunks, model_name
+    )
+    cancelled = threading.Event()
+    if model_name == EmotionModel.GPT2:
+        tokens = stream_prompt_with_gpt2(base_prompt, cancelled)
+    else:
+        tokens = stream_prompt_with_emo_llama(base_prompt, cancelled)
+
+    async def events():
+        try:
+            async for text in iterate_in_threadpool(tokens):
+                yield format_sse("token", {"text": text})
+            yield format_sse("done", {"model": model_name})
+        finally:
+            # Client went away or the stream finished: stop generating.
+            cancelled.set()
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers=SSE_HEADERS
+    )
@@ -13,6 +13,7 @@ from transformers.models.wav2vec2.modeling_wav2vec2 import (
 from src.api.config import DEVICE
 from src.api.constants import AUDIO_EMOTION_MODEL
 from src.api.schemas import AudioVADScore
+from src.pcm_audio import open_pcm_audio
 
 
 class RegressionHead(nn.Module):
@@ -59,33 +60,19 @@ def process_func(
     return outputs[0 if embeddings else 1].cpu().numpy()
 
 
-def get_emotion_scores_from_file(
-    audio_file: str | bytes | io.BytesIO,
+def get_emotion_scores(
+    audio: np.ndarray,
+    sr: int,
     sampling_rate: int = 16000,
     embeddings: bool = False,
 ) -> AudioVADScore:
-    """
-    Reads either a filepath or raw bytes/BytesIO, then returns arousal/dominance/valence.
-    """
-    if isinstance(audio_file, (bytes, bytearray, io.BytesIO)):
-        buf = (
-            io.BytesIO(audio_file)
-            if isinstance(audio_file, (bytes, bytearray))
-            else audio_file
-        )
-        audio, sr = sf.read(buf)
-    else:
-        audio, sr = sf.read(audio_file)
-
-    if audio.ndim > 1:
-        audio = np.mean(audio, axis=1)
-
+    """Arousal/dominance/valence for mono float samples at rate `sr`."""
     if sr != sampling_rate:
         audio = librosa.resample(
             audio.astype(np.float32), orig_sr=sr, target_sr=sampling_rate
         )
     else:
-        audio = audio.astype(np.float32)
+        audio = audio.astype(np.float32, copy=False)
 
     scores = process_func(audio[np.newaxis, :], sampling_rate, embeddings)[0]
     return AudioVADScore(
@@ -93,3 +80,28 @@ def get_emotion_scores_from_file(
         dominance=float(scores[1]),
         valence=float(scores[2]),
     )
+
+
+def get_emotion_scores_from_file(
+    audio_file: str | bytes | io.BytesIO,
+    sampling_rate: int = 16000,
+    embeddings: bool = False,
+) -> AudioVADScore:
+    """
+    Reads either a filepath (through open_pcm_audio) or raw bytes/BytesIO
+    (WAV, FLAC or Ogg/Opus), then returns arousal/dominance/valence.
+    """
+    if isinstance(audio_file, (bytes, bytearray, io.BytesIO)):
+        buf = (
+            io.BytesIO(audio_file)
+            if isinstance(audio_file, (bytes, bytearray))
+            else audio_file
+        )
+        audio, sr = sf.read(buf, dtype="float32")
+        if audio.ndim > 1:
+            audio = np.mean(audio, axis=1)
+    else:
+        with open_pcm_audio(audio_file) as pcm:
+            audio, sr = pcm.read(), pcm.sample_rate
+
+    return get_emotion_scores(audio, sr, sampling_rate, embeddings)
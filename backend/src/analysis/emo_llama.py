@@ -1,36 +1,48 @@
+import threading
 import time
-from src.api.config import get_logger
+from typing import Iterator
+from src.api.config import EMO_LLAMA_REVISION, get_logger
 from transformers import (
     AutoTokenizer,
     AutoModelForCausalLM,
 )
 import torch
+from src.analysis.model_cache import model_cache
+from src.analysis.streaming import stream_generate
 from src.api.constants import EMOTION_LLAMA_MODEL
+from src.api.schemas import EmotionModel
 
 logger = get_logger()
 
 
-def analyze_prompt_with_emo_llama(prompt: str) -> str:
-    time_start = time.time()
-    logger.info("Starting analysis with Emotion LLaMA model...")
-
-    tokenizer = AutoTokenizer.from_pretrained(EMOTION_LLAMA_MODEL, use_fast=True)
+def load_emo_llama() -> tuple[AutoTokenizer, AutoModelForCausalLM]:
+    tokenizer = AutoTokenizer.from_pretrained(
+        EMOTION_LLAMA_MODEL, revision=EMO_LLAMA_REVISION, use_fast=True
+    )
     tokenizer.pad_token = tokenizer.eos_token
 
     model = AutoModelForCausalLM.from_pretrained(
         EMOTION_LLAMA_MODEL,
+        revision=EMO_LLAMA_REVISION,
         trust_remote_code=True,
         torch_dtype=torch.float16,
         device_map={"": "cpu"},
     )
     model.generation_config.temperature = None
     model.generation_config.top_p = None
+    model.eval()
+    return tokenizer, model
+
 
+model_cache.register(EmotionModel.EMO_LLAMA, load_emo_llama)
+
+
+def prepare_inputs(tokenizer, prompt: str) -> dict:
     full_prompt = (
         f"What is the emotion state of the speaker in the following text? {prompt}"
     )
 
-    input_features = tokenizer(
+    return tokenizer(
         full_prompt,
         return_tensors="pt",
         padding=True,
@@ -38,18 +50,46 @@ def analyze_prompt_with_emo_llama(prompt: str) -> str:
         max_length=2048,
     )
 
-    output_ids = model.generate(
-        **input_features,
-        do_sample=True,
-        temperature=0.9,
-        top_p=0.6,
-        max_new_tokens=256,
+
+GENERATION_PARAMS = {
+    "do_sample": True,
+    "temperature": 0.9,
+    "top_p": 0.6,
+    "max_new_tokens": 256,
+}
+
+
+def generation_kwargs(tokenizer) -> dict:
+    return dict(
+        **GENERATION_PARAMS,
         eos_token_id=tokenizer.eos_token_id,  # stop at EOS
         pad_token_id=tokenizer.eos_token_id,  # for safety
     )
 
+
+def analyze_prompt_with_emo_llama(prompt: str) -> str:
+    time_start = time.time()
+    logger.info("Starting analysis with Emotion LLaMA model...")
+
+    tokenizer, model = model_cache.get(EmotionModel.EMO_LLAMA)
+    input_features = prepare_inputs(tokenizer, prompt)
+
+    with torch.no_grad():
+        output_ids = model.generate(**input_features, **generation_kwargs(tokenizer))
+
     answer = tokenizer.decode(output_ids[0], skip_special_tokens=True)
     logger.info(f"Generated analysis: {answer}")
     clean_answer = answer.replace(prompt, "")
     logger.info(f"Analysis completed in {time.time() - time_start:.2f} seconds.")
     return clean_answer
+
+
+def stream_prompt_with_emo_llama(
+    prompt: str, cancelled: threading.Event
+) -> Iterator[str]:
+    """Streaming variant of analyze_prompt_with_emo_llama."""
+    tokenizer, model = model_cache.get(EmotionModel.EMO_LLAMA)
+    input_features = prepare_inputs(tokenizer, prompt)
+    yield from stream_generate(
+        model, tokenizer, cancelled, **input_features, **generation_kwargs(tokenizer)
+    )
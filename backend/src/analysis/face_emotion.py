@@ -1,6 +1,11 @@
+import queue
+import threading
+from functools import lru_cache
+from typing import Callable, Iterator
+
 from moviepy import VideoFileClip
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
 from PIL import Image
-import pandas as pd
 import torch
 import numpy as np
 from facenet_pytorch import MTCNN
@@ -9,27 +14,196 @@ from transformers import (
     AutoModelForImageClassification,
     AutoConfig,
 )
-from src.api.config import DEVICE, get_logger
+from src.api.config import (
+    DEVICE,
+    FACE_CROP_HEIGHT,
+    FACE_DETECTION_HEIGHT,
+    FACE_FRAME_BATCH_SIZE,
+    FACE_PIPELINE_QUEUE_DEPTH,
+    get_logger,
+)
 from src.api.constants import FACE_EMOTION_MODEL
+from src.api.schemas import FaceEmotions
 
 logger = get_logger()
 
+# Minimum face size in pixels of the full-resolution frame.
+MIN_FACE_SIZE = 200
 
 device = torch.device(DEVICE)
-mtcnn = MTCNN(
+mtcnn_kwargs = dict(
     image_size=160,
     margin=0,
-    min_face_size=200,
     thresholds=[0.6, 0.7, 0.7],
     factor=0.709,
     post_process=True,
     keep_all=False,
     device=device,
 )
+mtcnn = MTCNN(min_face_size=MIN_FACE_SIZE, **mtcnn_kwargs)
 extractor = AutoFeatureExtractor.from_pretrained(FACE_EMOTION_MODEL)
 model = AutoModelForImageClassification.from_pretrained(FACE_EMOTION_MODEL).to(device)
 config = AutoConfig.from_pretrained(FACE_EMOTION_MODEL)
 id2label = config.id2label
+# Classifier outputs that have a matching FaceEmotions field.
+face_label_indices = [
+    (int(i), label)
+    for i, label in id2label.items()
+    if label in FaceEmotions.model_fields
+]
+
+size = extractor.size
+classifier_input_size = (
+    min(size.get("height", 224), size.get("width", 224))
+    if isinstance(size, dict)
+    else int(size)
+)
+# Faces at least this large are upscaled to the classifier input; smaller
+# ones are re-cropped from the higher-resolution crop stream.
+MIN_UPSCALE_FACE_SIZE = classifier_input_size // 2
+
+
+@lru_cache(maxsize=8)
+def get_detector(min_face_size: int) -> MTCNN:
+    """
+    Return an MTCNN detector for the given minimum face size, so that
+    downscaled frames skip the same pyramid levels as full-resolution ones.
+    """
+    if min_face_size == MIN_FACE_SIZE:
+        return mtcnn
+    return MTCNN(min_face_size=min_face_size, **mtcnn_kwargs)
+
+
+class FrameSource:
+    """
+    Decodes a video at a reduced detection resolution. A second stream at
+    FACE_CROP_HEIGHT is only opened when a face is too small to upscale
+    from the detection frame.
+    """
+
+    def __init__(
+        self,
+        video_path: str,
+        detection_height: int = FACE_DETECTION_HEIGHT,
+        crop_height: int = FACE_CROP_HEIGHT,
+    ):
+        self.video_path = video_path
+        infos = ffmpeg_parse_infos(video_path)
+        full_w, full_h = infos["video_size"]
+        # moviepy swaps the frame size of rotated (portrait) videos.
+        if infos.get("video_rotation", 0) in (90, 270):
+            full_w, full_h = full_h, full_w
+        self.clip = self._open(detection_height, full_h)
+        self.scale = full_h / self.clip.h
+        self._crop_height = crop_height
+        self._full_h = full_h
+        self._crop_clip = None
+        logger.info(
+            f"Decoding {full_w}x{full_h} video at {self.clip.w}x{self.clip.h} "
+            "for face detection"
+        )
+
+    def _open(self, height: int, full_h: int) -> VideoFileClip:
+        if height and full_h > height:
+            return VideoFileClip(
+                self.video_path, audio=False, target_resolution=(None, height)
+            )
+        return VideoFileClip(self.video_path, audio=False)
+
+    @property
+    def fps(self) -> float:
+        return self.clip.fps
+
+    @property
+    def can_recrop(self) -> bool:
+        """Whether the crop stream has more pixels than the detection frames."""
+        return min(self._crop_height or self._full_h, self._full_h) > self.clip.h
+
+    def iter_frames(
+        self, start: float, end: float, sample_fps: float
+    ) -> Iterator[tuple[float, np.ndarray]]:
+        """Yield (absolute_time, frame) pairs at detection resolution."""
+        subclip = self.clip.subclipped(start, end)
+        for t, frame in subclip.iter_frames(fps=sample_fps, with_times=True):
+            yield start + t, frame
+
+    def crop_frame(self, t: float) -> np.ndarray:
+        """Decode the frame at time t at crop resolution."""
+        if self._crop_clip is None:
+            self._crop_clip = self._open(self._crop_height, self._full_h)
+        return self._crop_clip.get_frame(t)
+
+    def close(self) -> None:
+        self.clip.close()
+        if self._crop_clip is not None:
+            self._crop_clip.close()
+
+
+def _crop_faces(
+    images: list,
+    scale: float = 1.0,
+    crop_frame: Callable[[int], np.ndarray] | None = None,
+) -> tuple[list[Image.Image], list[int]]:
+    """
+    Run face detection on a batch of same-sized images and return the face
+    crops together with the indices of the images they came from.
+    """
+    images = [
+        Image.fromarray(image) if isinstance(image, np.ndarray) else image
+        for image in images
+    ]
+    if not images:
+        return [], []
+
+    detector = get_detector(max(1, round(MIN_FACE_SIZE / scale)))
+    try:
+        batch_boxes, _ = detector.detect(images)
+    except RuntimeError:
+        return [], []
+
+    faces, face_indices = [], []
+    for i, boxes in enumerate(batch_boxes):
+        if boxes is None or len(boxes) == 0 or boxes[0] is None:
+            continue
+        image, box = images[i], boxes[0]
+        face_side = min(box[2] - box[0], box[3] - box[1])
+        if crop_frame is not None and face_side < MIN_UPSCALE_FACE_SIZE:
+            larger = Image.fromarray(crop_frame(i))
+            box = box * (larger.height / image.height)
+            image = larger
+        faces.append(image.crop(tuple(box)))
+        face_indices.append(i)
+    return faces, face_indices
+
+
+def _classify_faces(faces: list[Image.Image]) -> np.ndarray:
+    """Return a (len(faces), num_labels) array of class probabilities."""
+    if not faces:
+        return np.empty((0, len(id2label)), dtype=np.float32)
+    inputs = extractor(images=faces, return_tensors="pt").to(device)
+    with torch.no_grad():
+        outputs = model(**inputs)
+    return torch.nn.functional.softmax(outputs.logits, dim=-1).cpu().numpy()
+
+
+def detect_emotions_batch(
+    images: list,
+    scale: float = 1.0,
+    crop_frame: Callable[[int], np.ndarray] | None = None,
+) -> tuple[list[int], np.ndarray]:
+    """
+    Detect emotions in a batch of same-sized PIL or numpy images.
+    Returns the indices of the images in which a face was detected and a
+    (len(indices), num_labels) array with their class probabilities.
+
+    Images may be downscaled frames, in which case `scale` maps their
+    coordinates back to the original resolution and `crop_frame(i)` supplies
+    a higher-resolution copy of image i when its face is too small to upscale.
+    """
+    faces, face_indices = _crop_faces(images, scale, crop_frame)
+    probs = _classify_faces(faces)
+    logger.info(f"Detected faces in {len(faces)}/{len(images)} frames")
+    return face_indices, probs
 
 
 def detect_emotions(image) -> tuple[Image.Image | None, dict | None]:
@@ -38,54 +212,154 @@ def detect_emotions(image) -> tuple[Image.Image | None, dict | None]:
     Returns a tuple (face_crop, probabilities_dict),
     or (None, None) if no face detected or error.
     """
-    if isinstance(image, np.ndarray):
-        image = Image.fromarray(image)
-
-    try:
-        boxes, _ = mtcnn.detect(image)
-    except RuntimeError:
+    faces, _ = _crop_faces([image])
+    if not faces:
         return None, None
+    probs = _classify_faces(faces)[0]
+    return faces[0], {id2label[i]: float(p) for i, p in enumerate(probs)}
 
-    if boxes is None or len(boxes) == 0 or boxes[0] is None:
-        return None, None
 
-    face = image.crop(boxes[0])
+class EmotionAccumulator:
+    """
+    Running per-label statistics of face emotion probabilities for one
+    interval, so frames never need to be kept around.
+    """
 
-    inputs = extractor(images=face, return_tensors="pt").to(device)
-    outputs = model(**inputs)
-    probs = (
-        torch.nn.functional.softmax(outputs.logits, dim=-1)[0].detach().cpu().numpy()
-    )
-    class_probs = {id2label[i]: float(probs[i]) for i in range(len(probs))}
-    logger.info(f"Detected emotions: {class_probs}")
-    return face, class_probs
+    def __init__(self, num_labels: int = len(id2label), track_spread: bool = False):
+        self.count = 0
+        self.sum = np.zeros(num_labels, dtype=np.float64)
+        self.sum_sq = np.zeros(num_labels, dtype=np.float64) if track_spread else None
+        self.max = np.zeros(num_labels, dtype=np.float64) if track_spread else None
+
+    def add(self, probs: np.ndarray) -> None:
+        """Add one (num_labels,) row or a (n, num_labels) block of rows."""
+        probs = np.atleast_2d(probs)
+        if not len(probs):
+            return
+        self.count += probs.shape[0]
+        self.sum += probs.sum(axis=0)
+        if self.sum_sq is not None:
+            self.sum_sq += np.square(probs, dtype=np.float64).sum(axis=0)
+            np.maximum(self.max, probs.max(axis=0), out=self.max)
+
+    def mean(self) -> np.ndarray | None:
+        return self.sum / self.count if self.count else None
+
+    def variance(self) -> np.ndarray | None:
+        if not self.count or self.sum_sq is None:
+            return None
+        mean = self.sum / self.count
+        return np.maximum(self.sum_sq / self.count - np.square(mean), 0.0)
+
+    def to_face_emotions(self) -> FaceEmotions:
+        mean = self.mean()
+        if mean is None:
+            return FaceEmotions()
+        return FaceEmotions(
+            **{label: float(mean[i]) for i, label in face_label_indices}
+        )
+
+
+_END_OF_STREAM = object()
+
+
+def _put(out: queue.Queue, item, stop: threading.Event) -> bool:
+    """Blocking put that gives up once the consumer has stopped."""
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _decode_frames(
+    source: FrameSource,
+    timestamps: list[tuple[float, float]],
+    sample_fps: float,
+    batch_size: int,
+    out: queue.Queue,
+    stop: threading.Event,
+) -> None:
+    """
+    Producer: decode sampled frames and push batches of
+    (interval_index, time, frame) onto the bounded queue.
+    """
+    try:
+        batch = []
+        for idx, (start, end) in enumerate(timestamps):
+            for t, frame in source.iter_frames(start, end, sample_fps):
+                batch.append((idx, t, frame))
+                if len(batch) >= batch_size:
+                    if not _put(out, batch, stop):
+                        return
+                    batch = []
+        if batch:
+            _put(out, batch, stop)
+    except Exception as e:
+        _put(out, e, stop)
+    finally:
+        _put(out, _END_OF_STREAM, stop)
 
 
 def analyze_video_intervals(
-    video_path: str, timestamps: list[tuple[float, float]], skip: int = 2
+    video_path: str,
+    timestamps: list[tuple[float, float]],
+    skip: int = 2,
+    batch_size: int = FACE_FRAME_BATCH_SIZE,
+    queue_depth: int = FACE_PIPELINE_QUEUE_DEPTH,
 ) -> list[dict]:
     """
     Analyze emotion distributions in specified video intervals.
 
+    Frames are decoded on a background thread into a queue of at most
+    `queue_depth` batches, while this thread runs face detection and
+    classification on them.
+
     Returns a list of dicts:
-      { 'timestamp': (start, end), 'emotions': {label: mean_prob, ...} }
+      { 'timestamp': (start, end), 'emotions': FaceEmotions(...) }
     """
-    clip = VideoFileClip(video_path).without_audio()
-    fps = clip.fps
-    results = []
+    source = FrameSource(video_path)
+    sample_fps = source.fps / skip
+    accumulators = [EmotionAccumulator() for _ in timestamps]
 
-    for start, end in timestamps:
-        subclip = clip.subclipped(start, end)
-        sample_fps = fps / skip
-        frames = [frame for frame in subclip.iter_frames(fps=sample_fps)]
+    frames: queue.Queue = queue.Queue(maxsize=max(1, queue_depth))
+    stop = threading.Event()
+    decoder = threading.Thread(
+        target=_decode_frames,
+        args=(source, timestamps, sample_fps, max(1, batch_size), frames, stop),
+        name="face-frame-decoder",
+        daemon=True,
+    )
+    decoder.start()
 
-        all_probs = []
-        for arr in frames:
-            _, probs = detect_emotions(arr)
-            if probs is not None:
-                all_probs.append(probs)
+    try:
+        while True:
+            batch = frames.get()
+            if batch is _END_OF_STREAM:
+                break
+            if isinstance(batch, Exception):
+                raise batch
 
-        mean_probs = pd.DataFrame(all_probs).mean().to_dict() if all_probs else {}
-        results.append({"timestamp": (start, end), "emotions": mean_probs})
+            face_indices, probs = detect_emotions_batch(
+                [frame for _, _, frame in batch],
+                scale=source.scale,
+                crop_frame=(
+                    (lambda i: source.crop_frame(batch[i][1]))
+                    if source.can_recrop
+                    else None
+                ),
+            )
+            intervals = np.array([batch[i][0] for i in face_indices], dtype=np.int64)
+            for idx in np.unique(intervals):
+                accumulators[idx].add(probs[intervals == idx])
+    finally:
+        stop.set()
+        decoder.join()
+        source.close()
 
-    return results
+    return [
+        {"timestamp": (start, end), "emotions": acc.to_face_emotions()}
+        for (start, end), acc in zip(timestamps, accumulators)
+    ]
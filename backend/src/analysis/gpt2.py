@@ -1,83 +1,234 @@
+import threading
 import time
+import weakref
+from typing import Iterator
 import torch
 from transformers import GPT2Tokenizer, GPT2LMHeadModel
 
+from src.analysis.model_cache import model_cache
+from src.analysis.prompt import ANSWER_INSTRUCTION, SYSTEM_PROMPT
+from src.analysis.streaming import stream_generate
 from src.api.config import get_logger
-from src.api.config import DEVICE
-
-tokenizer = GPT2Tokenizer.from_pretrained("gpt2")
-lm_model = GPT2LMHeadModel.from_pretrained("gpt2")
-
-lm_model.config.pad_token_id = tokenizer.eos_token_id
+from src.api.config import DEVICE, GPT2_BATCH_TOKEN_BUDGET, GPT2_REVISION
+from src.api.constants import GPT2_MODEL
+from src.api.schemas import EmotionModel
 
 device = torch.device(DEVICE)
-lm_model.to(device).eval()
 
 logger = get_logger()
 
+HEADER_TEXT = f"{SYSTEM_PROMPT}\n\nTimeline:\n"
+TRAILER_TEXT = f"\n{ANSWER_INSTRUCTION}"
+GENERATION_KWARGS = {"do_sample": True, "top_p": 0.9}
+
+# Legacy ((key, value), ...) past key/values, one pair per layer. GPT-2 in the
+# pinned transformers reads this format and rejects Cache objects.
+PastKeyValues = tuple[tuple[torch.Tensor, torch.Tensor], ...]
+
+# Header past key/values per loaded model; dropped when the model is evicted.
+_header_caches: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def load_gpt2() -> tuple[GPT2Tokenizer, GPT2LMHeadModel]:
+    tokenizer = GPT2Tokenizer.from_pretrained(GPT2_MODEL, revision=GPT2_REVISION)
+    lm_model = GPT2LMHeadModel.from_pretrained(GPT2_MODEL, revision=GPT2_REVISION)
+    lm_model.config.pad_token_id = tokenizer.eos_token_id
+    lm_model.to(device).eval()
+    return tokenizer, lm_model
+
 
-def analyze_prompt_with_gpt2(prompt: str, max_analysis_tokens: int = 200) -> str:
+model_cache.register(EmotionModel.GPT2, load_gpt2)
+
+
+def plan_micro_batches(
+    lengths: list[int], new_tokens: int, token_budget: int
+) -> list[list[int]]:
     """
-    Break a full text prompt into context-sized windows (including instruction header and trailer),
-    run each through GPT-2, and concatenate the generated analyses.
+    Group window indices into micro-batches whose padded size
+    (rows * (longest prompt + new tokens)) stays within `token_budget`.
+    Windows are sorted by length first so that each batch pads little.
+    """
+    batches: list[list[int]] = []
+    current: list[int] = []
+    width = 0
+    for idx in sorted(range(len(lengths)), key=lambda i: lengths[i]):
+        new_width = max(width, lengths[idx] + new_tokens)
+        if current and (len(current) + 1) * new_width > token_budget:
+            batches.append(current)
+            current, new_width = [], lengths[idx] + new_tokens
+        current.append(idx)
+        width = new_width
+    if current:
+        batches.append(current)
+    return batches
+
+
+def pad_after_prefix(
+    rows: list[list[int]], prefix_len: int, pad_id: int
+) -> tuple[torch.Tensor, torch.Tensor]:
+    """
+    Pad token rows that share their first `prefix_len` tokens into
+    (input_ids, attention_mask) tensors. Padding goes right after the shared
+    prefix rather than at the very left, so the prefix sits at the same
+    positions in every row and its cached key/values can be reused, while
+    all rows still end together for generation.
+    """
+    width = max(len(r) for r in rows)
+    input_ids = torch.full((len(rows), width), pad_id, dtype=torch.long)
+    attention_mask = torch.ones((len(rows), width), dtype=torch.long)
+    for i, row in enumerate(rows):
+        pad = width - len(row)
+        input_ids[i, :prefix_len] = torch.tensor(row[:prefix_len], dtype=torch.long)
+        input_ids[i, prefix_len + pad :] = torch.tensor(
+            row[prefix_len:], dtype=torch.long
+        )
+        attention_mask[i, prefix_len : prefix_len + pad] = 0
+    return input_ids.to(device), attention_mask.to(device)
 
-    :param prompt: Pre-constructed prompt string (header + timeline + instruction).
-    :param max_analysis_tokens: Number of tokens GPT-2 should generate for each window.
-    :return: Concatenated analysis text across all windows.
+
+def get_header_cache(tokenizer, lm_model) -> tuple[list[int], PastKeyValues]:
     """
-    start_time = time.time()
+    Return the header token ids and their past key/values, computed once per
+    loaded model and reused by every window of every request.
+    """
+    cached = _header_caches.get(lm_model)
+    if cached is None:
+        header_ids = tokenizer.encode(HEADER_TEXT, add_special_tokens=False)
+        with torch.no_grad():
+            outputs = lm_model(
+                input_ids=torch.tensor([header_ids], device=device),
+                use_cache=True,
+            )
+        cached = (header_ids, outputs.past_key_values)
+        _header_caches[lm_model] = cached
+    return cached
+
+
+def expand_cache(cache: PastKeyValues, batch_size: int) -> PastKeyValues:
+    """Repeat a batch-1 prefix cache for every row of a batch."""
+    return tuple(
+        tuple(t.repeat_interleave(batch_size, dim=0) for t in layer) for layer in cache
+    )
+
 
+def build_window_inputs(
+    tokenizer,
+    lm_model,
+    prompt: str,
+    header_ids: list[int],
+    max_analysis_tokens: int,
+) -> list[list[int]]:
+    """
+    Split the prompt's timeline into windows that fit the context next to the
+    header, trailer and generated tokens, and return header + window + trailer
+    token ids for each.
+    """
     model_max = lm_model.config.n_positions  # typically 1024
     max_prompt_tokens = model_max - max_analysis_tokens
 
-    header_text = (
-        "You are a clinical psychologist.  Below is a multimodal breakdown of a speaker.\n"
-        "Please summarize their overall emotional and psychological condition.\n\n"
-        "Timeline:\n"
-    )
-    trailer_text = "\nAnswer in a few paragraphs:"
+    trailer_ids = tokenizer.encode(TRAILER_TEXT, add_special_tokens=False)
 
-    header_ids = tokenizer.encode(header_text, add_special_tokens=False)
-    trailer_ids = tokenizer.encode(trailer_text, add_special_tokens=False)
-
-    all_ids = tokenizer.encode(prompt, add_special_tokens=False)
-    middle_ids = all_ids[len(header_ids) :]
-    if len(trailer_ids) > 0:
-        middle_ids = middle_ids[: -len(trailer_ids)]
+    timeline = prompt.removeprefix(HEADER_TEXT).removesuffix(TRAILER_TEXT)
+    middle_ids = tokenizer.encode(timeline, add_special_tokens=False)
 
     chunk_size = max_prompt_tokens - len(header_ids) - len(trailer_ids)
 
     middle_windows = [
         middle_ids[i : i + chunk_size] for i in range(0, len(middle_ids), chunk_size)
     ]
+    return [header_ids + win_ids + trailer_ids for win_ids in middle_windows]
+
+
+def analyze_prompt_with_gpt2(
+    prompt: str,
+    max_analysis_tokens: int = 200,
+    token_budget: int = GPT2_BATCH_TOKEN_BUDGET,
+) -> str:
+    """
+    Break a full text prompt into context-sized windows (including instruction header and trailer),
+    run them through GPT-2 in padded micro-batches that start from the cached header
+    key/values, and concatenate the generated analyses.
+
+    :param prompt: Pre-constructed prompt string (header + timeline + instruction).
+    :param max_analysis_tokens: Number of tokens GPT-2 should generate for each window.
+    :param token_budget: Maximum padded tokens (prompt + generation) per micro-batch.
+    :return: Concatenated analysis text across all windows, in window order.
+    """
+    start_time = time.time()
+    tokenizer, lm_model = model_cache.get(EmotionModel.GPT2)
 
-    analyses = []
-    for idx, win_ids in enumerate(middle_windows, 1):
-        input_ids = header_ids + win_ids + trailer_ids
-        input_tensor = torch.tensor([input_ids], device=device)
-        attention_mask = torch.ones_like(input_tensor)
+    header_ids, header_cache = get_header_cache(tokenizer, lm_model)
+    window_inputs = build_window_inputs(
+        tokenizer, lm_model, prompt, header_ids, max_analysis_tokens
+    )
 
-        total_len = input_tensor.shape[-1] + max_analysis_tokens
+    batches = plan_micro_batches(
+        [len(ids) for ids in window_inputs], max_analysis_tokens, token_budget
+    )
+    analysis_texts: list[str] = [""] * len(window_inputs)
+    for batch in batches:
+        input_ids, attention_mask = pad_after_prefix(
+            [window_inputs[i] for i in batch],
+            len(header_ids),
+            lm_model.config.pad_token_id,
+        )
         with torch.no_grad():
             output_ids = lm_model.generate(
-                input_ids=input_tensor,
+                input_ids=input_ids,
                 attention_mask=attention_mask,
-                max_length=total_len,
-                do_sample=True,
-                top_p=0.9,
+                past_key_values=expand_cache(header_cache, len(batch)),
+                max_new_tokens=max_analysis_tokens,
                 pad_token_id=lm_model.config.pad_token_id,
-            )[0]
-
-        gen_ids = output_ids[len(input_ids) :]
-        analysis_text = tokenizer.decode(gen_ids, skip_special_tokens=True).strip()
-
-        analyses.append(
-            f"=== Analysis window {idx}/{len(middle_windows)} ===\n{analysis_text}"
-        )
+                **GENERATION_KWARGS,
+            )
+
+        gen_ids = output_ids[:, input_ids.shape[-1] :]
+        for i, text in zip(
+            batch, tokenizer.batch_decode(gen_ids, skip_special_tokens=True)
+        ):
+            analysis_texts[i] = text.strip()
+
+    analyses = [
+        f"=== Analysis window {idx}/{len(window_inputs)} ===\n{text}"
+        for idx, text in enumerate(analysis_texts, 1)
+    ]
 
     end_time = time.time()
     logger.info(
-        f"GPT-2 total analysis time: {end_time - start_time:.2f}s across {len(middle_windows)} window(s)"
+        f"GPT-2 total analysis time: {end_time - start_time:.2f}s across "
+        f"{len(window_inputs)} window(s) in {len(batches)} batch(es)"
     )
 
     return "\n\n".join(analyses)
+
+
+def stream_prompt_with_gpt2(
+    prompt: str, cancelled: threading.Event, max_analysis_tokens: int = 200
+) -> Iterator[str]:
+    """
+    Streaming variant of analyze_prompt_with_gpt2: windows are generated one
+    after another and their text is yielded as GPT-2 produces it.
+    """
+    tokenizer, lm_model = model_cache.get(EmotionModel.GPT2)
+    header_ids, header_cache = get_header_cache(tokenizer, lm_model)
+    window_inputs = build_window_inputs(
+        tokenizer, lm_model, prompt, header_ids, max_analysis_tokens
+    )
+
+    for idx, ids in enumerate(window_inputs, 1):
+        if cancelled.is_set():
+            return
+        separator = "\n\n" if idx > 1 else ""
+        yield f"{separator}=== Analysis window {idx}/{len(window_inputs)} ===\n"
+        input_ids = torch.tensor([ids], device=device)
+        yield from stream_generate(
+            lm_model,
+            tokenizer,
+            cancelled,
+            input_ids=input_ids,
+            attention_mask=torch.ones_like(input_ids),
+            past_key_values=expand_cache(header_cache, 1),
+            max_new_tokens=max_analysis_tokens,
+            pad_token_id=lm_model.config.pad_token_id,
+            **GENERATION_KWARGS,
+        )
@@ -0,0 +1,150 @@
+import gc
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+import torch
+
+from src.api.config import (
+    LLM_CACHE_IDLE_SECONDS,
+    LLM_CACHE_MAX_BYTES,
+    get_logger,
+)
+
+logger = get_logger()
+
+Loader = Callable[[], tuple[Any, Any]]
+
+
+class CachedModel:
+    def __init__(self, tokenizer, model, size_bytes: int):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.size_bytes = size_bytes
+        self.last_used = time.monotonic()
+
+
+class ModelCache:
+    """
+    Process-wide LRU cache of (tokenizer, model) pairs for the generative
+    models. Models are loaded on first use, evicted least-recently-used when
+    the memory budget would be exceeded, and unloaded after sitting idle.
+    """
+
+    def __init__(self, max_bytes: int, idle_seconds: float):
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self._loaders: dict[str, Loader] = {}
+        self._entries: OrderedDict[str, CachedModel] = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: dict[str, threading.Lock] = {}
+        self._reaper: threading.Thread | None = None
+
+    def register(self, name: str, loader: Loader) -> None:
+        """Register the function that loads `name` as (tokenizer, model)."""
+        self._loaders[name] = loader
+
+    def get(self, name: str) -> tuple[Any, Any]:
+        """Return (tokenizer, model) for `name`, loading it if needed."""
+        if name not in self._loaders:
+            raise KeyError(f"No loader registered for model {name!r}")
+
+        entry = self._touch(name)
+        if entry is None:
+            with self._lock:
+                load_lock = self._load_locks.setdefault(name, threading.Lock())
+            # Only one thread loads a given model; the others wait for it.
+            with load_lock:
+                entry = self._touch(name) or self._load(name)
+        return entry.tokenizer, entry.model
+
+    def warm_up(self, names: list[str]) -> None:
+        """Load the given models ahead of the first request."""
+        for name in names:
+            if name not in self._loaders:
+                logger.warning(f"Cannot warm up unknown model {name!r}")
+                continue
+            self.get(name)
+
+    def unload(self, name: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(name, None)
+        if entry is not None:
+            logger.info(
+                f"Unloaded model {name!r} ({entry.size_bytes / 1024**2:.0f} MB)"
+            )
+            del entry
+            self._release_memory()
+
+    def loaded(self) -> list[str]:
+        with self._lock:
+            return list(self._entries)
+
+    def _touch(self, name: str) -> CachedModel | None:
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                entry.last_used = time.monotonic()
+                self._entries.move_to_end(name)
+            return entry
+
+    def _load(self, name: str) -> CachedModel:
+        start_time = time.time()
+        tokenizer, model = self._loaders[name]()
+        size_bytes = model.get_memory_footprint()
+        entry = CachedModel(tokenizer, model, size_bytes)
+
+        with self._lock:
+            evicted = self._evict_for(size_bytes)
+            self._entries[name] = entry
+        if evicted:
+            self._release_memory()
+
+        logger.info(
+            f"Loaded model {name!r} ({size_bytes / 1024**2:.0f} MB) "
+            f"in {time.time() - start_time:.2f} seconds"
+        )
+        self._start_reaper()
+        return entry
+
+    def _evict_for(self, size_bytes: int) -> list[str]:
+        """Drop least-recently-used models until `size_bytes` fits the budget."""
+        evicted = []
+        used = sum(e.size_bytes for e in self._entries.values())
+        while self._entries and used + size_bytes > self.max_bytes:
+            name, entry = self._entries.popitem(last=False)
+            used -= entry.size_bytes
+            evicted.append(name)
+            logger.info(f"Evicted model {name!r} to stay within the memory budget")
+        return evicted
+
+    def _start_reaper(self) -> None:
+        if self.idle_seconds <= 0 or self._reaper is not None:
+            return
+        self._reaper = threading.Thread(
+            target=self._reap_idle, name="model-cache-reaper", daemon=True
+        )
+        self._reaper.start()
+
+    def _reap_idle(self) -> None:
+        interval = min(self.idle_seconds, 60)
+        while True:
+            time.sleep(interval)
+            cutoff = time.monotonic() - self.idle_seconds
+            with self._lock:
+                idle = [n for n, e in self._entries.items() if e.last_used < cutoff]
+            for name in idle:
+                logger.info(f"Model {name!r} idle for {self.idle_seconds:.0f}s")
+                self.unload(name)
+
+    @staticmethod
+    def _release_memory() -> None:
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+
+model_cache = ModelCache(
+    max_bytes=LLM_CACHE_MAX_BYTES, idle_seconds=LLM_CACHE_IDLE_SECONDS
+)
@@ -1,30 +1,214 @@
+import asyncio
+import random
+import weakref
+
 from fastapi import HTTPException, status
-from openai import OpenAI, OpenAIError
-from src.api.config import OPENAI_API_KEY, get_logger
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    AsyncOpenAI,
+    InternalServerError,
+    OpenAIError,
+    RateLimitError,
+)
+from pymongo.errors import DuplicateKeyError
+from redis.asyncio import Redis
+from redis.exceptions import LockError
+
+from src.analysis.prompt import OPENAI_PROMPT, build_condition_messages
+from src.api.config import (
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    OPENAI_LOCK_TIMEOUT_SECONDS,
+    OPENAI_MAX_CONCURRENCY,
+    OPENAI_MAX_RETRIES,
+    OPENAI_MODEL,
+    OPENAI_TIMEOUT_SECONDS,
+    REDIS_URL,
+    get_logger,
+)
+from src.api.schemas import OpenAIAnalysisItem
+from src.mongodb import get_item, openai_analysis_collection
 
 logger = get_logger()
 
 if not OPENAI_API_KEY:
     raise ValueError("OPENAI_API_KEY must be set in the environment variables.")
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+RETRYABLE_ERRORS = (
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    RateLimitError,
+)
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+# Time for the Mongo reads and write around the OpenAI request.
+LOCK_SLACK_SECONDS = 60.0
+# The lock must outlive the worst-case request: every attempt timing out,
+# with the longest backoff between them.
+LOCK_TTL_SECONDS = max(
+    OPENAI_LOCK_TIMEOUT_SECONDS,
+    OPENAI_TIMEOUT_SECONDS * (OPENAI_MAX_RETRIES + 1)
+    + BACKOFF_MAX_SECONDS * OPENAI_MAX_RETRIES
+    + LOCK_SLACK_SECONDS,
+)
+
+
+class LoopResources:
+    """
+    Async clients and coordination state for one event loop. The API uses a
+    single loop, so there the OPENAI_MAX_CONCURRENCY bound and the in-flight
+    sharing cover the whole process. RQ jobs run each request in a fresh loop,
+    where they only cover that job; the Redis lock still keeps jobs from
+    duplicating an analysis. Jobs call close_loop_resources when done.
+    """
+
+    def __init__(self):
+        self.client = AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            base_url=OPENAI_BASE_URL,
+            timeout=OPENAI_TIMEOUT_SECONDS,
+            max_retries=0,  # retries are handled below, with jitter
+        )
+        self.semaphore = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+        self.redis = Redis.from_url(REDIS_URL)
+        self.inflight: dict[str, asyncio.Task] = {}
+
+    async def aclose(self) -> None:
+        await self.client.close()
+        await self.redis.aclose()
+
+
+_resources: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def get_loop_resources() -> LoopResources:
+    loop = asyncio.get_running_loop()
+    resources = _resources.get(loop)
+    if resources is None:
+        resources = _resources[loop] = LoopResources()
+    return resources
+
+
+async def close_loop_resources() -> None:
+    """Close the running loop's clients, e.g. before asyncio.run returns."""
+    resources = _resources.pop(asyncio.get_running_loop(), None)
+    if resources is not None:
+        await resources.aclose()
 
 
-def make_request_to_openai(prompt: dict):
+async def make_request_to_openai(prompt: list[dict[str, str]]) -> str:
+    """
+    Send the chat prompt to OpenAI, holding one of OPENAI_MAX_CONCURRENCY
+    slots, and retry transient failures with full-jitter exponential backoff.
+    """
+    resources = get_loop_resources()
     logger.info(f"Making request to OpenAI with prompt: {prompt}")
+    for attempt in range(OPENAI_MAX_RETRIES + 1):
+        try:
+            async with resources.semaphore:
+                resp = await resources.client.chat.completions.create(
+                    model=OPENAI_MODEL,
+                    messages=prompt,
+                )
+            logger.info(f"OpenAI response: {resp}")
+            return resp.choices[0].message.content
+        except RETRYABLE_ERRORS as e:
+            if attempt == OPENAI_MAX_RETRIES:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail=f"OpenAI request failed after {attempt + 1} attempts: {e}",
+                )
+            delay = random.uniform(
+                0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2**attempt)
+            )
+            logger.warning(
+                f"OpenAI request failed ({type(e).__name__}), retrying in {delay:.1f}s"
+            )
+            await asyncio.sleep(delay)
+        except OpenAIError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=getattr(e, "message", str(e)),
+            )
+
+
+def find_openai_analysis(video_id: str) -> OpenAIAnalysisItem | None:
+    item = openai_analysis_collection.find_one({"video_id": video_id})
+    return OpenAIAnalysisItem.model_validate(item) if item else None
+
+
+async def _generate_openai_analysis(video_id: str) -> OpenAIAnalysisItem:
+    # Another process may have finished while we waited for the lock.
+    existing = await asyncio.to_thread(find_openai_analysis, video_id)
+    if existing:
+        return existing
+
+    edi = await asyncio.to_thread(get_item, video_id)
+    if not edi:
+        raise HTTPException(404, "Video not found.")
+
+    segments = edi.emotion_chunks
+    if not segments:
+        raise HTTPException(400, "No emotion segments found for this video.")
+
+    base_prompt = build_condition_messages(segments, OPENAI_PROMPT)
+    response_content = await make_request_to_openai(base_prompt)
+
+    oai = OpenAIAnalysisItem(
+        video_id=video_id,
+        prompt=base_prompt,
+        analysis=response_content,
+    )
     try:
-        resp = client.chat.completions.create(
-            model="gpt-4o",
-            messages=prompt,
+        await asyncio.to_thread(
+            openai_analysis_collection.insert_one, oai.as_document()
         )
-        logger.info(f"OpenAI response: {resp}")
+    except DuplicateKeyError:
+        logger.warning(f"[{video_id}]: OpenAI analysis already stored")
+    return oai
+
 
-    except OpenAIError as e:
+async def create_openai_analysis(video_id: str) -> OpenAIAnalysisItem:
+    """
+    Generate and store the analysis while holding a Redis lock for the
+    video, so only one API process or worker calls OpenAI for it.
+    """
+    lock = get_loop_resources().redis.lock(
+        f"openai_analysis:{video_id}",
+        timeout=LOCK_TTL_SECONDS,
+        blocking_timeout=LOCK_TTL_SECONDS,
+    )
+    if not await lock.acquire():
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=e.get("error", {}).get(
-                "message", "An error occurred while processing your request."
-            ),
-            type=e.get("error", {}).get("type", "unknown_error"),
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="OpenAI analysis for this video is still in progress.",
         )
-    return resp.choices[0].message.content
+    try:
+        return await _generate_openai_analysis(video_id)
+    finally:
+        try:
+            await lock.release()
+        except LockError as e:
+            # The result is already stored (or the error already raised).
+            logger.warning(f"[{video_id}]: could not release OpenAI lock: {e}")
+
+
+async def get_or_create_openai_analysis(video_id: str) -> OpenAIAnalysisItem:
+    """
+    Return the stored analysis, or generate it. Concurrent callers in this
+    process share one in-flight task per video.
+    """
+    existing = await asyncio.to_thread(find_openai_analysis, video_id)
+    if existing:
+        return existing
+
+    inflight = get_loop_resources().inflight
+    task = inflight.get(video_id)
+    if task is None:
+        task = asyncio.create_task(create_openai_analysis(video_id))
+        inflight[video_id] = task
+        task.add_done_callback(lambda _: inflight.pop(video_id, None))
+    # Shield so that one client disconnecting does not cancel the others.
+    return await asyncio.shield(task)
@@ -6,17 +6,30 @@ import time
 
 from src.api.config import get_logger
 from src.minio import MinioClient
-from src.mongodb import emotion_detection_collection
-from src.file_processing import break_audio_into_chunks, extract_audio_from_video
+from src.mongodb import get_item, save_item
+from src.file_processing import (
+    audio_extension,
+    break_audio_into_chunks,
+    extract_audio_from_video,
+    transcode_audio,
+)
 from src.analysis.transcript import get_transcript
 from src.analysis.short import emotional_detection_for_each_timestamp
 from src.analysis.face_emotion import analyze_video_intervals
 from src.api.schemas import (
-    EmotionDetectionItem,
     TranscriptionResult,
-    FaceEmotions,
+    VideoStage,
+)
+from src.analysis.audio_emotion import get_emotion_scores
+from src.pcm_audio import open_pcm_audio
+from src.summary_tasks import enqueue_summary_precompute
+from src.analytics import update_video_rollup
+from src.progress import (
+    publish_failed,
+    publish_finished,
+    publish_segment_progress,
+    publish_step,
 )
-from src.analysis.audio_emotion import get_emotion_scores_from_file
 
 logger = get_logger()
 minio = MinioClient()
@@ -26,40 +39,42 @@ def extract_audio_task(video_id: str) -> None:
     start = time.time()
     logger.info(f"[{video_id}]: extract_audio_task start")
 
-    rec = emotion_detection_collection.find_one({"_id": video_id})
-    if not rec:
+    edi = get_item(video_id, with_segments=False)
+    if not edi:
         msg = f"No record found for video {video_id}"
         logger.error(msg)
         raise RuntimeError(msg)
 
-    edi = EmotionDetectionItem.model_validate(rec)
-    data = minio.get_fileobj_in_memory(minio.bucket_name, edi.video_object_path).read()
-
-    with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as vf:
-        vf.write(data)
-        video_path = vf.name
+    video_path = minio.download_to_tempfile(
+        minio.bucket_name, edi.video_object_path, suffix=".mp4"
+    )
+    wav_path = stored_path = None
 
     try:
         with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as af:
             wav_path = af.name
         extract_audio_from_video(video_path, wav_path)
 
-        audio_key = f"audio/{video_id}.wav"
-        with open(wav_path, "rb") as wf:
+        ext = audio_extension()
+        with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as tf:
+            stored_path = tf.name
+        transcode_audio(wav_path, stored_path)
+
+        audio_key = f"audio/{video_id}{ext}"
+        with open(stored_path, "rb") as wf:
             minio.upload_fileobj(wf, minio.bucket_name, audio_key)
 
         edi.audio_object_path = audio_key
         edi.audio_extracted_at = datetime.datetime.now(datetime.timezone.utc)
 
-        emotion_detection_collection.update_one(
-            {"_id": video_id}, {"$set": edi.as_document()}
-        )
+        save_item(edi)
+        publish_step(video_id, "audio_extracted", VideoStage.AUDIO_EXTRACTED)
 
         elapsed = time.time() - start
         logger.info(f"[{video_id}]: audio extracted in {elapsed:.2f}s → {audio_key}")
 
     finally:
-        for p in (video_path, wav_path):
+        for p in filter(None, (video_path, wav_path, stored_path)):
             try:
                 os.remove(p)
             except OSError:
@@ -71,33 +86,27 @@ def analyze_audio_task(video_id: str) -> None:
     start = time.time()
     logger.info(f"[{video_id}]: analyze_audio_task start")
 
-    rec = emotion_detection_collection.find_one({"_id": video_id})
-    if not rec:
+    edi = get_item(video_id, with_segments=False)
+    if not edi:
         msg = f"No record for video {video_id}"
         logger.error(msg)
         raise RuntimeError(msg)
 
-    edi = EmotionDetectionItem.model_validate(rec)
     if not edi.audio_object_path:
         msg = f"Missing audio for video {video_id}"
         logger.error(msg)
         raise RuntimeError(msg)
 
-    data = minio.get_fileobj_in_memory(minio.bucket_name, edi.audio_object_path).read()
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as af:
-        af.write(data)
-        wav_path = af.name
+    audio_path = minio.download_to_tempfile(minio.bucket_name, edi.audio_object_path)
 
     try:
-        tr: TranscriptionResult = get_transcript(wav_path)
+        tr: TranscriptionResult = get_transcript(audio_path)
         logger.info(f"[{video_id}]: transcribed in {time.time() - start:.2f}s")
         edi.transcription_completed_at = datetime.datetime.now(datetime.timezone.utc)
         edi.transcription_result = tr.text
-        emotion_detection_collection.update_one(
-            {"_id": video_id},
-            {
-                "$set": edi.as_document(),
-            },
+        save_item(edi)
+        publish_step(
+            video_id, "transcription_completed", VideoStage.TRANSCRIPTION_COMPLETED
         )
 
         chunks = emotional_detection_for_each_timestamp(tr)
@@ -106,15 +115,18 @@ def analyze_audio_task(video_id: str) -> None:
         edi.transcription_chunks_emotion_completed_at = datetime.datetime.now(
             datetime.timezone.utc
         )
-        emotion_detection_collection.update_one(
-            {"_id": video_id}, {"$set": edi.as_document()}
+        save_item(edi, with_segments=True)
+        publish_step(
+            video_id,
+            "emotions_detected",
+            VideoStage.TRANSCRIPTION_CHUNKS_EMOTION_COMPLETED,
         )
 
         logger.info(f"[{video_id}]: emotions detected ({len(chunks)})")
 
     finally:
         try:
-            os.remove(wav_path)
+            os.remove(audio_path)
         except OSError:
             pass
         logger.info(f"[{video_id}]: cleaned temp file")
@@ -123,34 +135,52 @@ def analyze_audio_task(video_id: str) -> None:
 def chunk_audio_task(video_id: str) -> None:
     logger.info(f"[{video_id}]: chunk_audio_task start")
 
-    rec = emotion_detection_collection.find_one({"_id": video_id})
-    if not rec:
+    edi = get_item(video_id)
+    if not edi:
         msg = f"No record for video {video_id}"
         logger.error(msg)
         raise RuntimeError(msg)
 
-    edi = EmotionDetectionItem.model_validate(rec)
     if not edi.audio_object_path or not edi.emotion_chunks:
         msg = f"Incomplete data for video {video_id}"
         logger.error(msg)
         raise RuntimeError(msg)
 
-    data = minio.get_fileobj_in_memory(minio.bucket_name, edi.audio_object_path).read()
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as af:
-        af.write(data)
-        wav_path = af.name
+    audio_path = minio.download_to_tempfile(minio.bucket_name, edi.audio_object_path)
 
     try:
         timestamps = [tuple(seg.timestamp) for seg in edi.emotion_chunks]
-        chunks = break_audio_into_chunks(wav_path, timestamps)
+        chunks = break_audio_into_chunks(audio_path, timestamps)
+
+        uploaded = 0
+
+        def on_uploaded(key: str) -> None:
+            nonlocal uploaded
+            uploaded += 1
+            publish_segment_progress(
+                video_id,
+                "chunking_audio",
+                VideoStage.TRANSCRIPTION_CHUNKS_EMOTION_COMPLETED,
+                uploaded,
+                len(chunks),
+            )
 
-        keys = []
-        for i, c in enumerate(chunks):
-            key = f"audio_chunks/{video_id}/chunk_{i}.wav"
-            with open(c.filename, "rb") as cf:
-                minio.upload_fileobj(cf, minio.bucket_name, key)
-            keys.append(key)
-            os.remove(c.filename)
+        ext = audio_extension()
+        try:
+            keys = minio.upload_many(
+                minio.bucket_name,
+                (
+                    (c.filename, f"audio_chunks/{video_id}/chunk_{i}{ext}")
+                    for i, c in enumerate(chunks)
+                ),
+                on_complete=on_uploaded,
+            )
+        finally:
+            for c in chunks:
+                try:
+                    os.remove(c.filename)
+                except OSError:
+                    pass
 
         updated = []
         for i, seg in enumerate(edi.emotion_chunks):
@@ -159,15 +189,14 @@ def chunk_audio_task(video_id: str) -> None:
 
         edi.audio_chunks_uploaded_at = datetime.datetime.now(datetime.timezone.utc)
         edi.emotion_chunks = updated
-        emotion_detection_collection.update_one(
-            {"_id": video_id}, {"$set": edi.as_document()}
-        )
+        save_item(edi, with_segments=True)
+        publish_step(video_id, "audio_chunked", VideoStage.AUDIO_CHUNKS_UPLOADED)
 
         logger.info(f"[{video_id}]: audio chunked ({len(updated)} chunks)")
 
     finally:
         try:
-            os.remove(wav_path)
+            os.remove(audio_path)
         except OSError:
             pass
         logger.info(f"[{video_id}]: cleaned temp file")
@@ -175,31 +204,48 @@ def chunk_audio_task(video_id: str) -> None:
 
 def calculate_audio_emotion_scores_task(video_id: str) -> None:
     logger.info(f"[{video_id}]: calculate_emotion_scores_task start")
-    rec = emotion_detection_collection.find_one({"_id": video_id})
-    if not rec:
+    edi = get_item(video_id)
+    if not edi:
         msg = f"No record for video {video_id}"
         logger.error(msg)
         raise RuntimeError(msg)
-    edi = EmotionDetectionItem.model_validate(rec)
+
     if not edi.emotion_chunks:
         msg = f"No audio chunks for video {video_id}"
         logger.error(msg)
         raise RuntimeError(msg)
+    if not edi.audio_object_path:
+        msg = f"Missing audio for video {video_id}"
+        logger.error(msg)
+        raise RuntimeError(msg)
     audio_calculations = []
-    for chunk in edi.emotion_chunks:
-        if not chunk.audio_chunk_file_path:
-            logger.warning(
-                f"[{video_id}]: No audio chunk file path for segment {chunk.id}"
-            )
-            continue
-        data = minio.get_fileobj_in_memory(
-            minio.bucket_name, chunk.audio_chunk_file_path
-        ).read()
-        scores = get_emotion_scores_from_file(data)
-        chunk.vad_score = scores
+    audio_path = minio.download_to_tempfile(minio.bucket_name, edi.audio_object_path)
+    try:
+        with open_pcm_audio(audio_path) as audio:
+            for i, chunk in enumerate(edi.emotion_chunks):
+                publish_segment_progress(
+                    video_id,
+                    "calculating_emotion_scores",
+                    VideoStage.AUDIO_CHUNKS_UPLOADED,
+                    i + 1,
+                    len(edi.emotion_chunks),
+                )
+                samples = audio.read(*chunk.timestamp)
+                if not samples.size:
+                    logger.warning(
+                        f"[{video_id}]: No audio for segment {chunk.timestamp}"
+                    )
+                    continue
+                chunk.vad_score = get_emotion_scores(samples, audio.sample_rate)
+    finally:
+        try:
+            os.remove(audio_path)
+        except OSError:
+            pass
     edi.audio_chunks_emotion_completed_at = datetime.datetime.now(datetime.timezone.utc)
-    emotion_detection_collection.update_one(
-        {"_id": video_id}, {"$set": edi.as_document()}
+    save_item(edi, with_segments=True)
+    publish_step(
+        video_id, "emotion_scores_calculated", VideoStage.AUDIO_CHUNKS_EMOTION_COMPLETED
     )
 
     logger.warning(f"[{video_id}]: audio chunk emotion scores calculated")
@@ -208,13 +254,12 @@ def calculate_audio_emotion_scores_task(video_id: str) -> None:
 
 def get_face_emotion_scores(video_id: str) -> list[dict]:
     logger.info(f"[{video_id}]: get_face_emotion_scores start")
-    rec = emotion_detection_collection.find_one({"_id": video_id})
-    if not rec:
+    edi = get_item(video_id)
+    if not edi:
         msg = f"No record for video {video_id}"
         logger.error(msg)
         raise RuntimeError(msg)
 
-    edi = EmotionDetectionItem.model_validate(rec)
     if not edi.emotion_chunks:
         msg = f"No emotion chunks for video {video_id}"
         logger.error(msg)
@@ -231,16 +276,9 @@ def get_face_emotion_scores(video_id: str) -> list[dict]:
         logger.error(msg)
         raise RuntimeError(msg)
 
-    video_obj = minio.get_fileobj_in_memory(minio.bucket_name, edi.video_object_path)
-    if not video_obj:
-        msg = f"No video data for {video_id}"
-        logger.error(msg)
-        raise RuntimeError(msg)
-
-    data = video_obj.read()
-    with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as vf:
-        vf.write(data)
-        tmp_path = vf.name
+    tmp_path = minio.download_to_tempfile(
+        minio.bucket_name, edi.video_object_path, suffix=".mp4"
+    )
 
     try:
         face_emotion_scores = analyze_video_intervals(tmp_path, timestamps)
@@ -253,13 +291,14 @@ def get_face_emotion_scores(video_id: str) -> list[dict]:
         for score in face_emotion_scores:
             for chunk in edi.emotion_chunks:
                 if chunk.timestamp == score["timestamp"]:
-                    chunk.face_emotions = FaceEmotions(**score["emotions"])
+                    chunk.face_emotions = score["emotions"]
                     break
         edi.video_face_recognition_emotion_at = datetime.datetime.now(
             datetime.timezone.utc
         )
-        emotion_detection_collection.update_one(
-            {"_id": video_id}, {"$set": edi.as_document()}
+        save_item(edi, with_segments=True)
+        publish_step(
+            video_id, "faces_detected", VideoStage.VIDEO_FACE_RECOGNITION_EMOTION
         )
         return face_emotion_scores
     finally:
@@ -270,9 +309,16 @@ def get_face_emotion_scores(video_id: str) -> list[dict]:
 
 
 def trigger_video_processing(video_id: str) -> str:
-    extract_audio_task(video_id)
-    analyze_audio_task(video_id)
-    chunk_audio_task(video_id)
-    calculate_audio_emotion_scores_task(video_id)
-    get_face_emotion_scores(video_id)
+    try:
+        extract_audio_task(video_id)
+        analyze_audio_task(video_id)
+        chunk_audio_task(video_id)
+        calculate_audio_emotion_scores_task(video_id)
+        get_face_emotion_scores(video_id)
+        update_video_rollup(video_id)
+    except Exception as e:
+        publish_failed(video_id, f"{type(e).__name__}: {e}")
+        raise
+    publish_finished(video_id)
+    enqueue_summary_precompute(video_id)
     return video_id
@@ -1,35 +1,226 @@
-from src.api.schemas import EmotionSegment
+from functools import lru_cache
+from typing import Callable
 
+from transformers import AutoTokenizer
 
-def build_condition_messages(chunks: list[EmotionSegment]) -> list[dict[str, str]]:
-    system_content = (
-        "You are a clinical psychologist. Below is a multimodal breakdown of a speaker.\n"
-        "Please summarize their overall emotional and psychological condition."
+from src.api.config import EMO_LLAMA_REVISION, GPT2_REVISION
+from src.api.constants import EMOTION_LLAMA_MODEL, GPT2_MODEL
+from src.api.schemas import (
+    AudioVADScore,
+    EmotionModel,
+    EmotionSegment,
+    FaceEmotions,
+)
+
+SYSTEM_PROMPT = (
+    "You are a clinical psychologist. Below is a multimodal breakdown of a speaker.\n"
+    "Please summarize their overall emotional and psychological condition."
+)
+ANSWER_INSTRUCTION = "Answer in a few paragraphs:"
+
+OPENAI_PROMPT = "openai"
+
+# Prompt token budgets per model. GPT-2's leaves room for 200 generated tokens
+# in its 1024 context; Emotion-LLaMA's matches its 2048-token truncation.
+PROMPT_TOKEN_BUDGETS = {
+    EmotionModel.GPT2: 800,
+    EmotionModel.EMO_LLAMA: 2000,
+    OPENAI_PROMPT: 8000,
+}
+
+# Progressively more aggressive formatting, tried in order until the prompt
+# fits the budget. Each level merges adjacent segments sharing an emotion.
+COMPACTION_LEVELS = [
+    {"top_k_faces": 3, "vad_decimals": 1, "max_words": None},
+    {"top_k_faces": 2, "vad_decimals": 1, "max_words": 25},
+    {"top_k_faces": 1, "vad_decimals": 1, "max_words": 8},
+]
+
+TokenCounter = Callable[[str], int]
+
+
+@lru_cache(maxsize=None)
+def get_token_counter(model_name: str) -> TokenCounter:
+    """
+    Token counter for the model's prompt. Only the tokenizer is loaded; the
+    OpenAI prompt is estimated at four characters per token.
+    """
+    if model_name == EmotionModel.GPT2:
+        tokenizer = AutoTokenizer.from_pretrained(GPT2_MODEL, revision=GPT2_REVISION)
+    elif model_name == EmotionModel.EMO_LLAMA:
+        tokenizer = AutoTokenizer.from_pretrained(
+            EMOTION_LLAMA_MODEL, revision=EMO_LLAMA_REVISION, use_fast=True
+        )
+    else:
+        return lambda text: len(text) // 4 + 1
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+
+
+def format_segment(
+    seg: EmotionSegment,
+    top_k_faces: int | None = None,
+    vad_decimals: int = 2,
+    max_words: int | None = None,
+) -> str:
+    start, end = seg.timestamp
+    ts = f"{int(start // 60):02d}:{int(start % 60):02d}-{int(end // 60):02d}:{int(end % 60):02d}"
+    te = f"{seg.emotion} ({seg.emotion_score:.2f})"
+    vad = seg.vad_score
+    if vad is None:
+        va = "n/a"
+    else:
+        d = vad_decimals
+        va = f"A{vad.arousal:.{d}f}/V{vad.valence:.{d}f}/D{vad.dominance:.{d}f}"
+    fe = seg.face_emotions
+    face_scores = {
+        k: getattr(fe, k)
+        for k in FaceEmotions.model_fields
+        if fe is not None and getattr(fe, k) is not None
+    }
+    if not face_scores:
+        face_str = "No face detected"
+    else:
+        if top_k_faces:
+            top = sorted(face_scores, key=face_scores.get, reverse=True)[:top_k_faces]
+            face_scores = {k: face_scores[k] for k in top}
+        face_str = ", ".join(f"{k}:{v:.2f}" for k, v in face_scores.items())
+    text = seg.text.strip()
+    if max_words is not None:
+        words = text.split()
+        if len(words) > max_words:
+            text = " ".join(words[:max_words]) + " …"
+    return f"[{ts}] Text: {text}  Text‐emo: {te}  Audio(VAD): {va}  Face: {face_str}"
+
+
+def _weighted_mean(values: list[float], weights: list[float]) -> float:
+    return sum(v * w for v, w in zip(values, weights)) / sum(weights)
+
+
+def merge_segments(segs: list[EmotionSegment]) -> EmotionSegment:
+    """
+    Merge consecutive segments into one spanning all of them. Scores are
+    averaged weighted by duration; the emotion is the one covering the most time.
+    """
+    if len(segs) == 1:
+        return segs[0]
+    weights = [max(seg.timestamp[1] - seg.timestamp[0], 1e-3) for seg in segs]
+
+    emotion_time: dict[str, float] = {}
+    for seg, w in zip(segs, weights):
+        emotion_time[seg.emotion] = emotion_time.get(seg.emotion, 0.0) + w
+    emotion = max(emotion_time, key=emotion_time.get)
+    same = [(seg, w) for seg, w in zip(segs, weights) if seg.emotion == emotion]
+
+    with_vad = [(seg.vad_score, w) for seg, w in zip(segs, weights) if seg.vad_score]
+    vad_score = None
+    if with_vad:
+        vad_weights = [w for _, w in with_vad]
+        vad_score = AudioVADScore(
+            **{
+                k: _weighted_mean([getattr(v, k) for v, _ in with_vad], vad_weights)
+                for k in AudioVADScore.model_fields
+            }
+        )
+
+    face_values = {}
+    for k in FaceEmotions.model_fields:
+        pairs = [
+            (getattr(seg.face_emotions, k), w)
+            for seg, w in zip(segs, weights)
+            if seg.face_emotions is not None
+            and getattr(seg.face_emotions, k) is not None
+        ]
+        if pairs:
+            face_values[k] = _weighted_mean(
+                [v for v, _ in pairs], [w for _, w in pairs]
+            )
+
+    return EmotionSegment(
+        timestamp=(segs[0].timestamp[0], segs[-1].timestamp[1]),
+        text=" ".join(seg.text.strip() for seg in segs),
+        emotion=emotion,
+        emotion_score=_weighted_mean(
+            [seg.emotion_score for seg, _ in same], [w for _, w in same]
+        ),
+        vad_score=vad_score,
+        face_emotions=FaceEmotions(**face_values) if face_values else None,
     )
 
-    lines = ["Timeline:"]
+
+def merge_same_emotion_runs(chunks: list[EmotionSegment]) -> list[EmotionSegment]:
+    """Merge runs of adjacent segments that share the same text emotion."""
+    merged, run = [], []
     for seg in chunks:
-        start, end = seg.timestamp
-        ts = f"{int(start // 60):02d}:{int(start % 60):02d}-{int(end // 60):02d}:{int(end % 60):02d}"
-        te = f"{seg.emotion} ({seg.emotion_score:.2f})"
-        vad = seg.vad_score
-        va = f"A{vad.arousal:.2f}/V{vad.valence:.2f}/D{vad.dominance:.2f}"
-        fe = seg.face_emotions
-        if all(getattr(fe, attr) is None for attr in type(fe).model_fields):
-            face_str = "No face detected"
-        else:
-            face_str = ", ".join(
-                f"{k}:{getattr(fe, k):.2f}" for k in type(fe).model_fields
-            )
-        text = seg.text.strip()
-        lines.append(
-            f"[{ts}] Text: {text}  Text‐emo: {te}  Audio(VAD): {va}  Face: {face_str}"
-        )
+        if run and seg.emotion != run[-1].emotion:
+            merged.append(merge_segments(run))
+            run = []
+        run.append(seg)
+    if run:
+        merged.append(merge_segments(run))
+    return merged
 
-    lines.append("\nAnswer in a few paragraphs:")
-    user_content = "\n".join(lines)
 
+def _render(lines: list[str]) -> list[dict[str, str]]:
+    user_content = "\n".join(["Timeline:", *lines, f"\n{ANSWER_INSTRUCTION}"])
     return [
-        {"role": "system", "content": system_content},
+        {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "user", "content": user_content},
     ]
+
+
+def _count_message_tokens(
+    messages: list[dict[str, str]], count_tokens: TokenCounter
+) -> int:
+    return count_tokens(flatten_messages(messages))
+
+
+def build_condition_messages(
+    chunks: list[EmotionSegment], model_name: str | None = None
+) -> list[dict[str, str]]:
+    """
+    Build the system/user messages describing the speaker's timeline.
+
+    With `model_name`, the timeline is compacted until it fits that model's
+    entry in PROMPT_TOKEN_BUDGETS, measured with its own tokenizer: adjacent
+    segments with the same emotion are merged, face labels are cut to the
+    top k, VAD scores are rounded and long texts are shortened. If that is
+    still too long, neighbouring segments are merged pairwise.
+    """
+    messages = _render([format_segment(seg) for seg in chunks])
+    if model_name is None:
+        return messages
+
+    budget = PROMPT_TOKEN_BUDGETS[model_name]
+    count_tokens = get_token_counter(model_name)
+    if _count_message_tokens(messages, count_tokens) <= budget:
+        return messages
+
+    segments = merge_same_emotion_runs(chunks)
+    for level in COMPACTION_LEVELS:
+        messages = _render([format_segment(seg, **level) for seg in segments])
+        if _count_message_tokens(messages, count_tokens) <= budget:
+            return messages
+
+    coarsest = COMPACTION_LEVELS[-1]
+    while len(segments) > 1:
+        segments = [
+            merge_segments(segments[i : i + 2]) for i in range(0, len(segments), 2)
+        ]
+        messages = _render([format_segment(seg, **coarsest) for seg in segments])
+        if _count_message_tokens(messages, count_tokens) <= budget:
+            break
+    return messages
+
+
+def flatten_messages(messages: list[dict[str, str]]) -> str:
+    """
+    Flatten condition messages into a single text prompt for the local
+    models (GPT-2, Emotion-LLaMA), which have no chat roles.
+    """
+    return "\n\n".join(m["content"] for m in messages)
+
+
+def build_condition_prompt(
+    chunks: list[EmotionSegment], model_name: str | None = None
+) -> str:
+    return flatten_messages(build_condition_messages(chunks, model_name))
@@ -82,4 +82,5 @@ def emotional_detection_for_each_timestamp(
     for i, segment in enumerate(transcript_chunks):
         segment.emotion = emotions[i]["emotions"][0]["label"]
         segment.emotion_score = emotions[i]["emotions"][0]["score"]
-    return transcript_chunks
+    # Stored in start order so time-range reads can stop early.
+    return sorted(transcript_chunks, key=lambda seg: seg.timestamp[0])
@@ -0,0 +1,93 @@
+"""
+Energy-based voice activity detection, used to skip silence and other
+non-speech stretches before running ASR.
+"""
+
+import numpy as np
+
+from src.api.config import (
+    SPEECH_GATE_MARGIN_DB,
+    SPEECH_GATE_MERGE_GAP_SECONDS,
+    SPEECH_GATE_PAD_SECONDS,
+    get_logger,
+)
+from src.pcm_audio import PcmAudio
+
+logger = get_logger()
+
+FRAME_SECONDS = 0.03
+# Frames per block read from the mapped audio; a block is ~60 s at 30 ms.
+FRAMES_PER_BLOCK = 2000
+# The threshold never drops below this, so near-digital silence with a very
+# low noise floor does not turn breaths and hiss into speech.
+MIN_SPEECH_DB = -50.0
+NOISE_FLOOR_PERCENTILE = 10
+MIN_SPEECH_SECONDS = 0.25
+
+
+def frame_energies_db(
+    audio: PcmAudio, frame_seconds: float = FRAME_SECONDS
+) -> np.ndarray:
+    """RMS level in dBFS of consecutive frames, read block by block."""
+    frame_len = max(1, int(frame_seconds * audio.sample_rate))
+    block_seconds = frame_len * FRAMES_PER_BLOCK / audio.sample_rate
+    energies = []
+    for _, block in audio.blocks(block_seconds):
+        n = len(block) // frame_len
+        if not n:
+            continue
+        frames = block[: n * frame_len].reshape(n, frame_len)
+        rms = np.sqrt(np.mean(np.square(frames), axis=1))
+        energies.append(20 * np.log10(rms + 1e-10))
+    return np.concatenate(energies) if energies else np.zeros(0, dtype=np.float32)
+
+
+def merge_regions(
+    regions: list[tuple[float, float]],
+    pad: float,
+    merge_gap: float,
+    duration: float,
+) -> list[tuple[float, float]]:
+    """Pad regions, clamp them to the track and merge those within `merge_gap`."""
+    merged: list[tuple[float, float]] = []
+    for start, end in regions:
+        start, end = max(0.0, start - pad), min(duration, end + pad)
+        if merged and start - merged[-1][1] <= merge_gap:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def detect_speech_regions(
+    audio: PcmAudio,
+    margin_db: float = SPEECH_GATE_MARGIN_DB,
+    pad: float = SPEECH_GATE_PAD_SECONDS,
+    merge_gap: float = SPEECH_GATE_MERGE_GAP_SECONDS,
+    frame_seconds: float = FRAME_SECONDS,
+) -> list[tuple[float, float]]:
+    """
+    (start, end) spans in seconds likely to contain speech: frames louder than
+    the noise floor by `margin_db`, kept if they last MIN_SPEECH_SECONDS, then
+    padded and merged.
+    """
+    db = frame_energies_db(audio, frame_seconds)
+    if not db.size:
+        return []
+    frame_s = max(1, int(frame_seconds * audio.sample_rate)) / audio.sample_rate
+    noise_floor = float(np.percentile(db, NOISE_FLOOR_PERCENTILE))
+    threshold = max(noise_floor + margin_db, MIN_SPEECH_DB)
+    active = np.concatenate(([False], db > threshold, [False]))
+    edges = np.flatnonzero(np.diff(active.astype(np.int8)))
+    regions = [
+        (s * frame_s, e * frame_s)
+        for s, e in zip(edges[::2], edges[1::2])
+        if (e - s) * frame_s >= MIN_SPEECH_SECONDS
+    ]
+    merged = merge_regions(regions, pad, merge_gap, audio.duration)
+    speech = sum(e - s for s, e in merged)
+    logger.info(
+        f"Speech gate: {len(merged)} regions, {speech:.1f}s of "
+        f"{audio.duration:.1f}s (threshold {threshold:.1f} dBFS)"
+    )
+    return merged
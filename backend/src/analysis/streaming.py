@@ -0,0 +1,66 @@
+import threading
+from typing import Iterator
+
+import torch
+from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+
+from src.api.config import get_logger
+
+logger = get_logger()
+
+
+class CancelledCriteria(StoppingCriteria):
+    """Stops generation once the given event is set."""
+
+    def __init__(self, cancelled: threading.Event):
+        self.cancelled = cancelled
+
+    def __call__(self, input_ids: torch.LongTensor, scores, **kwargs) -> torch.Tensor:
+        return torch.full(
+            (input_ids.shape[0],),
+            self.cancelled.is_set(),
+            dtype=torch.bool,
+            device=input_ids.device,
+        )
+
+
+def stream_generate(
+    model, tokenizer, cancelled: threading.Event, **generate_kwargs
+) -> Iterator[str]:
+    """
+    Run model.generate() on a background thread and yield decoded text as
+    tokens are produced. Setting `cancelled`, or closing this generator,
+    stops generation at the next token.
+    """
+    streamer = TextIteratorStreamer(
+        tokenizer, skip_prompt=True, skip_special_tokens=True
+    )
+    errors: list[Exception] = []
+
+    def run():
+        try:
+            with torch.no_grad():
+                model.generate(
+                    **generate_kwargs,
+                    streamer=streamer,
+                    stopping_criteria=StoppingCriteriaList(
+                        [CancelledCriteria(cancelled)]
+                    ),
+                )
+        except Exception as e:
+            logger.exception("Streaming generation failed")
+            errors.append(e)
+            streamer.end()
+
+    thread = threading.Thread(target=run, name="stream-generate", daemon=True)
+    thread.start()
+    try:
+        yield from streamer
+    except GeneratorExit:
+        cancelled.set()
+        raise
+    finally:
+        thread.join()
+
+    if errors:
+        raise errors[0]
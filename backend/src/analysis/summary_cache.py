@@ -0,0 +1,96 @@
+import hashlib
+import json
+import time
+from typing import Callable, NamedTuple
+
+from pymongo.errors import DuplicateKeyError
+
+from src.analysis import emo_llama, gpt2
+from src.analysis.prompt import build_condition_messages, flatten_messages
+from src.api.config import EMO_LLAMA_REVISION, GPT2_REVISION, get_logger
+from src.api.schemas import EmotionModel, EmotionSegment, SummaryCacheItem
+from src.mongodb import summary_cache_collection
+
+logger = get_logger()
+
+
+class Summarizer(NamedTuple):
+    generate: Callable[[str], str]
+    revision: str
+    params: dict
+
+
+SUMMARIZERS: dict[EmotionModel, Summarizer] = {
+    EmotionModel.GPT2: Summarizer(
+        gpt2.analyze_prompt_with_gpt2,
+        GPT2_REVISION,
+        {"max_analysis_tokens": 200, **gpt2.GENERATION_KWARGS},
+    ),
+    EmotionModel.EMO_LLAMA: Summarizer(
+        emo_llama.analyze_prompt_with_emo_llama,
+        EMO_LLAMA_REVISION,
+        emo_llama.GENERATION_PARAMS,
+    ),
+}
+
+
+def stable_hash(value) -> str:
+    """SHA-256 of the canonical JSON encoding of `value`."""
+    encoded = json.dumps(value, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def summary_cache_key(
+    video_id: str, model_name: EmotionModel, messages: list[dict[str, str]]
+) -> dict:
+    summarizer = SUMMARIZERS[model_name]
+    return {
+        "video_id": video_id,
+        "model": str(model_name),
+        "model_revision": summarizer.revision,
+        "params_hash": stable_hash(summarizer.params),
+        "prompt_hash": stable_hash(messages),
+    }
+
+
+def find_cached_summary(
+    video_id: str, model_name: EmotionModel, segments: list[EmotionSegment]
+) -> SummaryCacheItem | None:
+    messages = build_condition_messages(segments, model_name)
+    doc = summary_cache_collection.find_one(
+        summary_cache_key(video_id, model_name, messages)
+    )
+    return SummaryCacheItem.model_validate(doc) if doc else None
+
+
+def summarize_with_cache(
+    video_id: str, model_name: EmotionModel, segments: list[EmotionSegment]
+) -> tuple[SummaryCacheItem, bool]:
+    """
+    Return the summary for the video's current segments, generating and
+    storing it on a cache miss. The flag is True when it came from the cache.
+    """
+    messages = build_condition_messages(segments, model_name)
+    key = summary_cache_key(video_id, model_name, messages)
+    cached = summary_cache_collection.find_one(key)
+    if cached:
+        logger.info(f"[{video_id}]: {model_name} summary served from cache")
+        return SummaryCacheItem.model_validate(cached), True
+
+    start_time = time.time()
+    prompt = flatten_messages(messages)
+    item = SummaryCacheItem(
+        **key,
+        prompt=prompt,
+        summary=SUMMARIZERS[model_name].generate(prompt),
+    )
+    try:
+        summary_cache_collection.insert_one(item.as_document())
+    except DuplicateKeyError:
+        # Another request generated the same summary first; keep theirs.
+        logger.info(f"[{video_id}]: {model_name} summary already cached")
+    logger.info(
+        f"[{video_id}]: {model_name} summary generated in "
+        f"{time.time() - start_time:.2f} seconds"
+    )
+    return item, False
@@ -1,19 +1,28 @@
-import torch
+import bisect
 import time
+
+import numpy as np
+import torch
 from transformers import pipeline
 from src.api.schemas import TranscriptionResult
 from src.api.constants import TRANSCRIPT_MODEL
-from src.api.config import get_logger
+from src.api.config import ASR_BATCH_SIZE, SPEECH_GATE_ENABLED, get_logger
+from src.analysis.speech_activity import detect_speech_regions
+from src.pcm_audio import open_pcm_audio
 
 logger = get_logger()
 
+CHUNK_LENGTH_S = 20
+# Silence put between packed speech spans so words do not run together.
+SPAN_GAP_SECONDS = 0.2
+
 init_start = time.time()
 device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
 logger.info(f"Loading ASR model on device: {device}")
 asr = pipeline(
     "automatic-speech-recognition",
     model=TRANSCRIPT_MODEL,
-    chunk_length_s=20,
+    chunk_length_s=CHUNK_LENGTH_S,
     stride_length_s=5,
     device=device,
     return_timestamps=True,
@@ -23,29 +32,134 @@ elapsed_time = time.time() - init_start
 logger.info(f"ASR model loaded in {elapsed_time:.2f} seconds")
 
 
-def get_transcript(audio_file_path: str) -> TranscriptionResult:
+class PackedWindow:
+    """
+    Consecutive speech spans concatenated into one ASR input, with the map
+    from positions in the window back to the original timeline.
     """
-    Run ASR on the given audio file and return the transcript text.
 
-    Raises:
-        ValueError: if the pipeline returns no "text" field.
+    def __init__(self):
+        self.pieces: list[np.ndarray] = []
+        self.length = 0.0
+        # Parallel lists: where each span starts in the window and originally.
+        self.window_starts: list[float] = []
+        self.origin_starts: list[float] = []
+        self.durations: list[float] = []
+
+    def add(self, samples: np.ndarray, origin_start: float, sample_rate: int) -> None:
+        if self.pieces:
+            gap = np.zeros(int(SPAN_GAP_SECONDS * sample_rate), dtype=np.float32)
+            self.pieces.append(gap)
+            self.length += len(gap) / sample_rate
+        duration = len(samples) / sample_rate
+        self.window_starts.append(self.length)
+        self.origin_starts.append(origin_start)
+        self.durations.append(duration)
+        self.pieces.append(samples)
+        self.length += duration
+
+    def to_original(self, t: float) -> float:
+        """Original time of window time `t`; times in a gap snap to a span edge."""
+        i = max(bisect.bisect_right(self.window_starts, t) - 1, 0)
+        offset = min(max(t - self.window_starts[i], 0.0), self.durations[i])
+        return self.origin_starts[i] + offset
+
+    def samples(self) -> np.ndarray:
+        return np.concatenate(self.pieces)
+
+
+def pack_regions(
+    audio, regions: list[tuple[float, float]], window_s: float = CHUNK_LENGTH_S
+) -> list[PackedWindow]:
     """
-    logger.info(f"Running on device: {device}")
-    start_time = time.time()
-    result = asr(
-        audio_file_path,
+    Pack speech regions, in order, into windows of at most `window_s`
+    seconds; a longer region gets a window of its own, which the pipeline
+    then chunks itself.
+    """
+    windows: list[PackedWindow] = []
+    current = PackedWindow()
+    for start, end in regions:
+        samples = audio.read(start, end)
+        if not samples.size:
+            continue
+        needed = len(samples) / audio.sample_rate + SPAN_GAP_SECONDS
+        if current.pieces and current.length + needed > window_s:
+            windows.append(current)
+            current = PackedWindow()
+        current.add(samples, start, audio.sample_rate)
+    if current.pieces:
+        windows.append(current)
+    return windows
+
+
+def _transcribe(windows: list[PackedWindow], sample_rate: int) -> list[dict]:
+    results = asr(
+        [{"raw": w.samples(), "sampling_rate": sample_rate} for w in windows],
+        batch_size=len(windows),
         generate_kwargs={
             "task": "transcribe",
             "language": "<|en|>",
         },
     )
+    for result in results:
+        if "text" not in result:
+            logger.error("No text found in transcription result")
+            raise ValueError("No text found in transcription result")
+    return results
+
+
+def get_transcript(
+    audio_file_path: str,
+    speech_gate: bool = SPEECH_GATE_ENABLED,
+    batch_size: int = ASR_BATCH_SIZE,
+) -> TranscriptionResult:
+    """
+    Run ASR on the given audio file and return the transcript text.
+
+    With `speech_gate`, only the detected speech regions are transcribed:
+    they are packed into windows of up to CHUNK_LENGTH_S seconds, run in
+    batches of `batch_size`, and chunk timestamps are mapped back onto the
+    original timeline. ASR time then follows the amount of speech rather
+    than the recording length.
+
+    Raises:
+        ValueError: if the pipeline returns no "text" field.
+    """
+    logger.info(f"Running on device: {device}")
+    start_time = time.time()
+    texts: list[str] = []
+    chunks: list[dict] = []
+    with open_pcm_audio(audio_file_path) as audio:
+        if speech_gate:
+            regions = detect_speech_regions(audio)
+        else:
+            regions = [(0.0, audio.duration)]
+        windows = pack_regions(audio, regions)
+        for i in range(0, len(windows), max(1, batch_size)):
+            group = windows[i : i + batch_size]
+            for window, result in zip(group, _transcribe(group, audio.sample_rate)):
+                texts.append(result["text"].strip())
+                for c in result.get("chunks", []):
+                    t0, t1 = c["timestamp"]
+                    if t1 is None:
+                        t1 = window.length
+                    chunks.append(
+                        {
+                            "timestamp": (
+                                window.to_original(t0 or 0.0),
+                                window.to_original(t1),
+                            ),
+                            "text": c["text"],
+                        }
+                    )
 
     end_time = time.time()
-    logger.info(f"Transcription completed in {end_time - start_time:.2f} seconds")
-    print(f"Transcription completed in {end_time - start_time:.2f} seconds")
-    if "text" not in result:
-        logger.error("No text found in transcription result")
-        raise ValueError("No text found in transcription result")
-    transcription_result = TranscriptionResult.model_validate(result)
-    logger.info(f"Transcription result: {result}")
+    logger.info(
+        f"Transcription of {len(regions)} regions in {len(windows)} windows "
+        f"completed in {end_time - start_time:.2f} seconds"
+    )
+    transcription_result = TranscriptionResult(
+        text=" ".join(t for t in texts if t), chunks=chunks
+    )
+    logger.info(f"Transcription result: {transcription_result.text}")
     return transcription_result
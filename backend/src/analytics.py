@@ -0,0 +1,208 @@
+"""
+Cross-video emotion rollups.
+
+Each video's segment statistics are stored in video_rollups, and every
+change to them is applied to its upload day in daily_rollups with $inc, so
+dashboards read a handful of precomputed documents instead of the corpus.
+"""
+
+import datetime
+
+from pymongo import ReturnDocument
+
+from src.api.config import get_logger
+from src.api.schemas import (
+    AudioVADScore,
+    DailyRollup,
+    EmotionSegment,
+    FaceEmotions,
+    VideoRollup,
+)
+from src.mongodb import (
+    daily_rollups_collection,
+    get_item,
+    video_rollups_collection,
+)
+
+logger = get_logger()
+
+
+def segment_stats(segments: list[EmotionSegment]) -> dict:
+    """Additive statistics for a list of segments: counts, seconds and sums."""
+    stats = {
+        "segments": len(segments),
+        "duration_s": 0.0,
+        "emotion_counts": {},
+        "emotion_seconds": {},
+        "vad_sums": {k: 0.0 for k in AudioVADScore.model_fields},
+        "vad_count": 0,
+        "face_sums": {},
+        "face_counts": {},
+    }
+    for seg in segments:
+        duration = max(seg.timestamp[1] - seg.timestamp[0], 0.0)
+        emotion = str(seg.emotion)
+        stats["duration_s"] += duration
+        stats["emotion_counts"][emotion] = stats["emotion_counts"].get(emotion, 0) + 1
+        stats["emotion_seconds"][emotion] = (
+            stats["emotion_seconds"].get(emotion, 0.0) + duration
+        )
+        if seg.vad_score is not None:
+            stats["vad_count"] += 1
+            for k in AudioVADScore.model_fields:
+                stats["vad_sums"][k] += getattr(seg.vad_score, k)
+        if seg.face_emotions is not None:
+            for k in FaceEmotions.model_fields:
+                value = getattr(seg.face_emotions, k)
+                if value is not None:
+                    stats["face_sums"][k] = stats["face_sums"].get(k, 0.0) + value
+                    stats["face_counts"][k] = stats["face_counts"].get(k, 0) + 1
+    return stats
+
+
+def _flatten(stats: dict, prefix: str = "") -> dict[str, float]:
+    flat = {}
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def _inc_day(day: str, delta: dict[str, float], videos: int) -> None:
+    inc = {f"stats.{k}": v for k, v in delta.items() if v}
+    if videos:
+        inc["videos"] = videos
+    if not inc:
+        return
+    daily_rollups_collection.update_one(
+        {"_id": day},
+        {
+            "$inc": inc,
+            "$set": {"updated_at": datetime.datetime.now(datetime.timezone.utc)},
+        },
+        upsert=True,
+    )
+
+
+def update_video_rollup(video_id: str) -> None:
+    """
+    Recompute the video's rollup from its segments and apply the difference
+    from the previous one to the day totals. Safe to call repeatedly.
+    """
+    edi = get_item(video_id)
+    if not edi:
+        logger.warning(f"[{video_id}]: no record to roll up")
+        return
+
+    stats = segment_stats(edi.emotion_chunks or [])
+    day = edi.created_at.date().isoformat()
+    previous = video_rollups_collection.find_one_and_replace(
+        {"_id": video_id},
+        {
+            "_id": video_id,
+            "day": day,
+            "stats": stats,
+            "updated_at": datetime.datetime.now(datetime.timezone.utc),
+        },
+        upsert=True,
+        return_document=ReturnDocument.BEFORE,
+    )
+
+    delta = _flatten(stats)
+    if previous and previous["day"] == day:
+        for k, v in _flatten(previous["stats"]).items():
+            delta[k] = delta.get(k, 0) - v
+        _inc_day(day, delta, videos=0)
+    else:
+        if previous:
+            remove_from_day(previous)
+        _inc_day(day, delta, videos=1)
+    logger.info(f"[{video_id}]: rollup updated for {day}")
+
+
+def remove_from_day(rollup: dict) -> None:
+    negated = {k: -v for k, v in _flatten(rollup["stats"]).items()}
+    _inc_day(rollup["day"], negated, videos=-1)
+
+
+def remove_video_rollup(video_id: str) -> None:
+    """Drop the video's rollup and subtract it from its day."""
+    previous = video_rollups_collection.find_one_and_delete({"_id": video_id})
+    if previous:
+        remove_from_day(previous)
+
+
+def rollup_fields(stats: dict) -> dict:
+    """Turn stored sums and counts into EmotionRollup fields."""
+    counts = {k: int(v) for k, v in stats.get("emotion_counts", {}).items() if v}
+    vad_count = stats.get("vad_count", 0)
+    face_counts = stats.get("face_counts", {})
+    avg_face = {
+        k: v / face_counts[k]
+        for k, v in stats.get("face_sums", {}).items()
+        if face_counts.get(k)
+    }
+    return {
+        "segments": stats.get("segments", 0),
+        "duration_s": stats.get("duration_s", 0.0),
+        "emotion_counts": counts,
+        "emotion_seconds": {
+            k: v for k, v in stats.get("emotion_seconds", {}).items() if k in counts
+        },
+        "avg_vad": (
+            {k: v / vad_count for k, v in stats["vad_sums"].items()}
+            if vad_count
+            else None
+        ),
+        "avg_face_emotions": avg_face or None,
+    }
+
+
+def get_video_rollup(video_id: str) -> VideoRollup | None:
+    doc = video_rollups_collection.find_one({"_id": video_id})
+    if not doc:
+        return None
+    return VideoRollup(video_id=video_id, day=doc["day"], **rollup_fields(doc["stats"]))
+
+
+def get_daily_rollups(
+    start: datetime.date | None = None, end: datetime.date | None = None
+) -> tuple[list[DailyRollup], DailyRollup]:
+    """Day rollups between `start` and `end` inclusive, and their total."""
+    query = {}
+    if start:
+        query["$gte"] = start.isoformat()
+    if end:
+        query["$lte"] = end.isoformat()
+    docs = list(
+        daily_rollups_collection.find({"_id": query} if query else {}).sort("_id", 1)
+    )
+
+    total_stats: dict[str, float] = {}
+    for doc in docs:
+        for k, v in _flatten(doc.get("stats", {})).items():
+            total_stats[k] = total_stats.get(k, 0) + v
+    nested: dict = {}
+    for path, value in total_stats.items():
+        *parents, leaf = path.split(".")
+        target = nested
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[leaf] = value
+
+    days = [
+        DailyRollup(
+            day=doc["_id"],
+            videos=doc.get("videos", 0),
+            **rollup_fields(doc.get("stats", {})),
+        )
+        for doc in docs
+    ]
+    totals = DailyRollup(
+        day=f"{docs[0]['_id']}/{docs[-1]['_id']}" if docs else "",
+        videos=sum(d.videos for d in days),
+        **rollup_fields(nested),
+    )
+    return days, totals
@@ -25,4 +25,47 @@ REGION_NAME = os.getenv("MINIO_REGION", "us-east-1")
 SIGNATURE_VERSION = os.getenv("MINIO_SIGNATURE_VERSION", "s3v4")
 DEFAULT_BUCKET_NAME = os.getenv("MINIO_BUCKET", "emotion-detection")
 DEVICE = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+FACE_DETECTION_HEIGHT = int(os.getenv("FACE_DETECTION_HEIGHT", "480"))
+# Height of the stream small faces are re-cropped from; decoding cost is
+# bounded by this rather than by the upload's resolution.
+FACE_CROP_HEIGHT = int(os.getenv("FACE_CROP_HEIGHT", "720"))
+FACE_FRAME_BATCH_SIZE = int(os.getenv("FACE_FRAME_BATCH_SIZE", "8"))
+FACE_PIPELINE_QUEUE_DEPTH = int(os.getenv("FACE_PIPELINE_QUEUE_DEPTH", "4"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o")
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "120"))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "4"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "4"))
+# Lower bound for the per-video OpenAI lock TTL; src.analysis.openai raises it
+# to cover every retry of a request.
+OPENAI_LOCK_TIMEOUT_SECONDS = float(os.getenv("OPENAI_LOCK_TIMEOUT_SECONDS", "300"))
+LLM_CACHE_MAX_BYTES = int(float(os.getenv("LLM_CACHE_MAX_GB", "16")) * 1024**3)
+LLM_CACHE_IDLE_SECONDS = float(os.getenv("LLM_CACHE_IDLE_SECONDS", "1800"))
+GPT2_BATCH_TOKEN_BUDGET = int(os.getenv("GPT2_BATCH_TOKEN_BUDGET", "8192"))
+GPT2_REVISION = os.getenv("GPT2_REVISION", "main")
+EMO_LLAMA_REVISION = os.getenv("EMO_LLAMA_REVISION", "main")
+PRECOMPUTE_SUMMARIES = [
+    m.strip() for m in os.getenv("PRECOMPUTE_SUMMARIES", "").split(",") if m.strip()
+]
+LLM_WARMUP = [m.strip() for m in os.getenv("LLM_WARMUP", "").split(",") if m.strip()]
+VIDEO_CACHE_TTL_SECONDS = int(os.getenv("VIDEO_CACHE_TTL_SECONDS", "300"))
+# Codec for audio stored in MinIO: "flac" (lossless), "opus" or "wav".
+AUDIO_STORAGE_CODEC = os.getenv("AUDIO_STORAGE_CODEC", "flac").lower()
+# S3 client tuning: connection pool size, multipart transfers and the
+# thread pool used by MinioClient.upload_many / download_many.
+MINIO_MAX_POOL_CONNECTIONS = int(os.getenv("MINIO_MAX_POOL_CONNECTIONS", "32"))
+MINIO_MULTIPART_THRESHOLD_MB = int(os.getenv("MINIO_MULTIPART_THRESHOLD_MB", "8"))
+MINIO_MULTIPART_CHUNKSIZE_MB = int(os.getenv("MINIO_MULTIPART_CHUNKSIZE_MB", "8"))
+MINIO_TRANSFER_CONCURRENCY = int(os.getenv("MINIO_TRANSFER_CONCURRENCY", "10"))
+MINIO_BULK_WORKERS = int(os.getenv("MINIO_BULK_WORKERS", "16"))
+# Energy-based speech gating before ASR: only padded, merged speech regions
+# are transcribed. Frames louder than the noise floor by the margin count
+# as speech.
+SPEECH_GATE_ENABLED = os.getenv("SPEECH_GATE_ENABLED", "true").lower() == "true"
+SPEECH_GATE_MARGIN_DB = float(os.getenv("SPEECH_GATE_MARGIN_DB", "12"))
+SPEECH_GATE_PAD_SECONDS = float(os.getenv("SPEECH_GATE_PAD_SECONDS", "0.3"))
+SPEECH_GATE_MERGE_GAP_SECONDS = float(os.getenv("SPEECH_GATE_MERGE_GAP_SECONDS", "1.0"))
+# Packed speech windows sent to Whisper per batch.
+ASR_BATCH_SIZE = int(os.getenv("ASR_BATCH_SIZE", "8"))
@@ -1,4 +1,7 @@
+GPT2_MODEL = "gpt2"
 TRANSCRIPT_MODEL = "openai/whisper-small"
 EMOTION_LLAMA_MODEL = "ZebangCheng/Emotion-LLaMA"
 AUDIO_EMOTION_MODEL = "audeering/wav2vec2-large-robust-12-ft-emotion-msp-dim"
 FACE_EMOTION_MODEL = "trpakov/vit-face-expression"
+# Causal LM that scores EmotionType labels for transcript chunks.
+EMOTION_LLM_MODEL = "gpt2"
@@ -2,7 +2,14 @@ from datetime import datetime, timezone
 from enum import StrEnum
 from typing import Annotated, Optional
 
-from pydantic import BaseModel, BeforeValidator, ConfigDict, Field
+from pydantic import (
+    BaseModel,
+    BeforeValidator,
+    ConfigDict,
+    Field,
+    SerializeAsAny,
+    model_validator,
+)
 
 PyObjectId = Annotated[str, BeforeValidator(str)]
 
@@ -30,6 +37,44 @@ class EmotionModel(StrEnum):
     EMO_LLAMA = "emo_llama"
 
 
+class VideoStage(StrEnum):
+    VIDEO_UPLOADED = "video_uploaded"
+    AUDIO_EXTRACTED = "audio_extracted"
+    TRANSCRIPTION_COMPLETED = "transcription_completed"
+    TRANSCRIPTION_CHUNKS_EMOTION_COMPLETED = "transcription_chunks_emotion_completed"
+    AUDIO_CHUNKS_UPLOADED = "audio_chunks_uploaded"
+    AUDIO_CHUNKS_EMOTION_COMPLETED = "audio_chunks_emotion_completed"
+    VIDEO_FACE_RECOGNITION_EMOTION = "video_face_recognition_emotion"
+
+
+# Timestamp field set when each stage completes, in pipeline order.
+VIDEO_STAGE_FIELDS: dict[VideoStage, str] = {
+    VideoStage.VIDEO_UPLOADED: "video_uploaded_at",
+    VideoStage.AUDIO_EXTRACTED: "audio_extracted_at",
+    VideoStage.TRANSCRIPTION_COMPLETED: "transcription_completed_at",
+    VideoStage.TRANSCRIPTION_CHUNKS_EMOTION_COMPLETED: "transcription_chunks_emotion_completed_at",
+    VideoStage.AUDIO_CHUNKS_UPLOADED: "audio_chunks_uploaded_at",
+    VideoStage.AUDIO_CHUNKS_EMOTION_COMPLETED: "audio_chunks_emotion_completed_at",
+    VideoStage.VIDEO_FACE_RECOGNITION_EMOTION: "video_face_recognition_emotion_at",
+}
+FINAL_VIDEO_STAGE = VideoStage.VIDEO_FACE_RECOGNITION_EMOTION
+
+
+class VideoStatus(StrEnum):
+    PROCESSING = "processing"
+    COMPLETED = "completed"
+
+
+class VideoView(StrEnum):
+    SUMMARY = "summary"
+    FULL = "full"
+
+
+class ExportFormat(StrEnum):
+    PARQUET = "parquet"
+    ARROW = "arrow"
+
+
 class Error(BaseSchema):
     code: int = Field(..., description="HTTP status code for the error")
     message: str = Field(..., description="Error message describing the issue")
@@ -147,7 +192,9 @@ class AudioChunk(BaseSchema):
     end: float = Field(..., description="End time of the audio chunk in seconds")
 
 
-class EmotionDetectionItem(BaseSchema):
+class VideoRecord(BaseSchema):
+    """Video metadata and pipeline timestamps, without the analysis results."""
+
     model_config = ConfigDict(
         serialize_by_alias=True,
     )
@@ -161,13 +208,6 @@ class EmotionDetectionItem(BaseSchema):
     audio_object_path: str | None = Field(
         None, description="MinIO key where the extracted audio is stored"
     )
-    transcription_result: str | None = Field(
-        default=None, description="Full ASR transcript of the video audio"
-    )
-    emotion_chunks: list[EmotionSegment] | None = Field(
-        default_factory=list,
-        description="List of detected emotions with timestamps",
-    )
     video_uploaded_at: datetime | None = Field(
         default=None,
         description="Timestamp when the video was uploaded",
@@ -196,6 +236,36 @@ class EmotionDetectionItem(BaseSchema):
         default=None,
         description="Timestamp when emotion detection on video faces was completed",
     )
+    processing_finished_at: datetime | None = Field(
+        default=None,
+        description="Timestamp when the pipeline finished, whatever its last stage",
+    )
+    processing_failed_at: datetime | None = Field(
+        default=None,
+        description="Timestamp when the pipeline failed",
+    )
+    processing_error: str | None = Field(
+        default=None,
+        description="Error that stopped the pipeline, if it failed",
+    )
+
+    def current_stage(self) -> VideoStage:
+        """Latest pipeline stage this video has completed."""
+        stage = VideoStage.VIDEO_UPLOADED
+        for candidate, field in VIDEO_STAGE_FIELDS.items():
+            if getattr(self, field) is not None:
+                stage = candidate
+        return stage
+
+
+class EmotionDetectionItem(VideoRecord):
+    transcription_result: str | None = Field(
+        default=None, description="Full ASR transcript of the video audio"
+    )
+    emotion_chunks: list[EmotionSegment] | None = Field(
+        default_factory=list,
+        description="List of detected emotions with timestamps",
+    )
 
     def as_document(self) -> dict:
         """Convert the model to a MongoDB document format."""
@@ -205,6 +275,26 @@ class EmotionDetectionItem(BaseSchema):
         return doc
 
 
+class VideoSummary(VideoRecord):
+    stage: VideoStage = Field(
+        default=VideoStage.VIDEO_UPLOADED,
+        description="Latest pipeline stage the video has completed",
+    )
+    status: VideoStatus = Field(
+        default=VideoStatus.PROCESSING, description="Overall processing status"
+    )
+
+    @model_validator(mode="after")
+    def derive_progress(self):
+        self.stage = self.current_stage()
+        self.status = (
+            VideoStatus.COMPLETED
+            if self.stage == FINAL_VIDEO_STAGE
+            else VideoStatus.PROCESSING
+        )
+        return self
+
+
 class UploadedVideoResponse(EmotionDetectionItem):
     extract_job_id: str = Field(
         description="Unique identifier for the video processing job",
@@ -213,12 +303,29 @@ class UploadedVideoResponse(EmotionDetectionItem):
 
 
 class VideosResponse(BaseSchema):
-    videos: list[EmotionDetectionItem] = Field(..., description="Video items list")
-    total: int = Field(..., description="Total number of videos in the collection")
+    videos: list[SerializeAsAny[VideoRecord]] = Field(
+        ..., description="Video items on this page, newest first"
+    )
+    next_cursor: str | None = Field(
+        default=None, description="Cursor for the next page, if there is one"
+    )
+    total: int | None = Field(
+        default=None,
+        description="Number of videos matching the filters, when requested",
+    )
 
     model_config = ConfigDict(json_schema_extra={"example": {"total": 1}})
 
 
+class SegmentsResponse(BaseSchema):
+    video_id: str = Field(..., description="ID of the video")
+    start: float | None = Field(default=None, description="Window start in seconds")
+    end: float | None = Field(default=None, description="Window end in seconds")
+    segments: list[EmotionSegment] = Field(
+        ..., description="Segments overlapping the window, in start order"
+    )
+
+
 class EmotionLLMResponse(BaseSchema):
     model: EmotionModel = Field(
         ..., description="Name of the emotion analysis model used"
@@ -258,3 +365,67 @@ class OpenAIAnalysisItem(BaseSchema):
         """Convert the model to a MongoDB document format."""
         doc = self.model_dump(exclude_none=True)
         return doc
+
+
+class SummaryCacheItem(BaseSchema):
+    video_id: str = Field(..., description="ID of the summarized video")
+    model: EmotionModel = Field(..., description="Model that produced the summary")
+    model_revision: str = Field(..., description="Model checkpoint revision")
+    params_hash: str = Field(..., description="Hash of the generation parameters")
+    prompt_hash: str = Field(..., description="Hash of the condition messages")
+    prompt: str = Field(..., description="Prompt the summary was generated from")
+    summary: str = Field(..., description="Generated summary")
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        description="UTC timestamp when the summary was generated",
+    )
+
+    def as_document(self) -> dict:
+        """Convert the model to a MongoDB document format."""
+        return self.model_dump(exclude_none=True)
+
+
+class EmotionRollup(BaseSchema):
+    segments: int = Field(default=0, description="Number of emotion segments")
+    duration_s: float = Field(default=0.0, description="Total segment duration")
+    emotion_counts: dict[str, int] = Field(
+        default_factory=dict, description="Segments per text emotion label"
+    )
+    emotion_seconds: dict[str, float] = Field(
+        default_factory=dict, description="Seconds per text emotion label"
+    )
+    avg_vad: AudioVADScore | None = Field(
+        default=None, description="Mean VAD scores over segments that have them"
+    )
+    avg_face_emotions: FaceEmotions | None = Field(
+        default=None, description="Mean face emotion probabilities"
+    )
+
+
+class VideoRollup(EmotionRollup):
+    video_id: str = Field(..., description="ID of the video")
+    day: str = Field(..., description="UTC day the video was uploaded, YYYY-MM-DD")
+
+
+class DailyRollup(EmotionRollup):
+    day: str = Field(..., description="UTC day, YYYY-MM-DD")
+    videos: int = Field(default=0, description="Videos uploaded that day")
+
+
+class AnalyticsResponse(BaseSchema):
+    days: list[DailyRollup] = Field(..., description="Per-day rollups in order")
+    totals: DailyRollup = Field(
+        ..., description="Rollup over all returned days; `day` is the range"
+    )
+
+
+class JobStatusResponse(BaseSchema):
+    job_id: str = Field(..., description="RQ job identifier")
+    status: str = Field(..., description="RQ job status, e.g. queued or finished")
+    step: str | None = Field(
+        default=None, description="Progress step reported by the job"
+    )
+    result: dict | None = Field(
+        default=None, description="Job result once it has finished"
+    )
+    error: str | None = Field(default=None, description="Error if the job failed")
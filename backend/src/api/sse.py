@@ -0,0 +1,16 @@
+import json
+
+
+def format_sse(event: str, data: dict) -> str:
+    """Encode one Server-Sent Events message with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+# Comment line sent while idle so proxies keep the connection open.
+SSE_KEEPALIVE = ": keepalive\n\n"
+SSE_KEEPALIVE_SECONDS = 15.0
@@ -0,0 +1,60 @@
+from src.analytics import remove_video_rollup
+from src.api.config import get_logger
+from src.minio import MinioClient
+from src.mongodb import (
+    delete_segments,
+    emotion_detection_collection,
+    get_item,
+    openai_analysis_collection,
+    summary_cache_collection,
+)
+from src.response_cache import invalidate_video
+
+logger = get_logger()
+minio = MinioClient()
+
+
+def video_object_prefixes(video_id: str) -> list[str]:
+    """Key prefixes under which the pipelines store the video's objects."""
+    return [
+        f"videos/{video_id}/",
+        f"audio/{video_id}.",
+        f"audio_chunks/{video_id}/",
+    ]
+
+
+def delete_video_artifacts(video_id: str) -> None:
+    """
+    Delete everything stored for the video: its objects in MinIO, in
+    batched DeleteObjects requests, and every record derived from it. The
+    video record goes last, so a failed run can be retried.
+    """
+    edi = get_item(video_id)
+    if not edi:
+        logger.warning(f"[{video_id}]: nothing to delete")
+        return
+
+    keys = set()
+    for prefix in video_object_prefixes(video_id):
+        keys.update(minio.list_keys(minio.bucket_name, prefix))
+    # Also any recorded keys that live outside the usual prefixes.
+    keys.update(
+        filter(
+            None,
+            [
+                edi.video_object_path,
+                edi.audio_object_path,
+                *(seg.audio_chunk_file_path for seg in edi.emotion_chunks or []),
+            ],
+        )
+    )
+    deleted = minio.delete_keys(minio.bucket_name, sorted(keys))
+    logger.info(f"[{video_id}]: deleted {deleted}/{len(keys)} objects")
+
+    openai_analysis_collection.delete_many({"video_id": video_id})
+    summary_cache_collection.delete_many({"video_id": video_id})
+    remove_video_rollup(video_id)
+    delete_segments(video_id)
+    emotion_detection_collection.delete_one({"_id": video_id})
+    invalidate_video(video_id)
+    logger.info(f"[{video_id}]: video deleted")
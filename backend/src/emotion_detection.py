@@ -1,50 +1,204 @@
 import time
+import weakref
 from rq import get_current_job
-from transformers import AutoTokenizer, AutoModelForCausalLM, GenerationConfig
+from transformers import (
+    AutoTokenizer,
+    AutoModelForCausalLM,
+    GenerationConfig,
+)
 import torch
 
+from src.analysis.model_cache import model_cache
 from src.api.constants import EMOTION_LLM_MODEL
 from src.api.config import get_logger
+from src.api.schemas import EmotionType
 
 logger = get_logger()
 
 use_cuda = torch.cuda.is_available()
 device = torch.device("cuda" if use_cuda else "cpu")
 
-tokenizer = AutoTokenizer.from_pretrained(EMOTION_LLM_MODEL, use_fast=True)
-tokenizer.pad_token = tokenizer.eos_token
+EMOTION_LLM = "emotion_llm"
 
-model = (
-    AutoModelForCausalLM.from_pretrained(
-        EMOTION_LLM_MODEL,
-        load_in_8bit=use_cuda,
-        device_map="auto" if use_cuda else None,
-        torch_dtype=torch.float16 if use_cuda else torch.float32,
-    )
-    .to(device)
-    .eval()
+PROMPT_TEMPLATE = (
+    "Given the following transcript, identify the speaker's emotion:\n{text}\nEmotion:"
 )
+# Content-free input used to estimate the model's bias towards each label.
+CONTENT_FREE_TEXT = "N/A"
+LABELS = list(EmotionType)
+SCORE_BATCH_SIZE = 16
+# Prompt budget; long transcripts are cut so the "Emotion:" cue survives.
+MAX_PROMPT_TOKENS = 512
 
-gen_config = GenerationConfig(
-    do_sample=True,
-    temperature=0.7,
-    top_p=0.8,
-    eos_token_id=tokenizer.eos_token_id,
-    pad_token_id=tokenizer.eos_token_id,
-)
+# Label scores for the content-free prompt per loaded model.
+_content_free_scores: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def load_emotion_llm() -> tuple[AutoTokenizer, AutoModelForCausalLM]:
+    tokenizer = AutoTokenizer.from_pretrained(EMOTION_LLM_MODEL, use_fast=True)
+    tokenizer.pad_token = tokenizer.eos_token
+    # Left padding keeps every prompt's last token in the final position.
+    tokenizer.padding_side = "left"
+
+    model = (
+        AutoModelForCausalLM.from_pretrained(
+            EMOTION_LLM_MODEL,
+            load_in_8bit=use_cuda,
+            device_map="auto" if use_cuda else None,
+            torch_dtype=torch.float16 if use_cuda else torch.float32,
+        )
+        .to(device)
+        .eval()
+    )
+    return tokenizer, model
+
+
+model_cache.register(EMOTION_LLM, load_emotion_llm)
+
+
+def build_prompt(tokenizer, text: str, max_tokens: int = MAX_PROMPT_TOKENS) -> str:
+    """
+    PROMPT_TEMPLATE around `text`, keeping only the transcript's last tokens
+    when the whole prompt would exceed `max_tokens`.
+    """
+    overhead = len(tokenizer.encode(PROMPT_TEMPLATE.format(text="")))
+    ids = tokenizer.encode(text, add_special_tokens=False)
+    budget = max(max_tokens - overhead, 0)
+    if len(ids) > budget:
+        text = tokenizer.decode(ids[len(ids) - budget :])
+    return PROMPT_TEMPLATE.format(text=text)
+
+
+@torch.no_grad()
+def label_log_likelihoods(tokenizer, model, prompts: list[str]) -> torch.Tensor:
+    """
+    Summed log-probability of each EmotionType label following each prompt,
+    shape (len(prompts), len(LABELS)).
+
+    The prompts are run once; their key/value cache is then repeated for
+    every label, so the remaining label tokens are scored in one batch.
+    """
+    enc = tokenizer(prompts, return_tensors="pt", padding=True).to(device)
+    mask = enc["attention_mask"]
+    out = model(
+        input_ids=enc["input_ids"],
+        attention_mask=mask,
+        position_ids=(mask.cumsum(-1) - 1).clamp(min=0),
+        use_cache=True,
+    )
+
+    label_ids = [
+        tokenizer.encode(f" {label}", add_special_tokens=False) for label in LABELS
+    ]
+    first_ids = torch.tensor([ids[0] for ids in label_ids], device=device)
+    scores = out.logits[:, -1].float().log_softmax(-1)[:, first_ids]
 
+    tail_len = max(len(ids) for ids in label_ids) - 1
+    if tail_len == 0:
+        return scores
 
-def emotional_detection(transcript: dict) -> str:
+    # Feed label tokens [:-1] after the prefix; their logits score tokens [1:].
+    n, num_labels = len(prompts), len(LABELS)
+    inputs = torch.full((num_labels, tail_len), tokenizer.pad_token_id)
+    targets = torch.zeros((num_labels, tail_len), dtype=torch.long)
+    label_mask = torch.zeros((num_labels, tail_len), dtype=torch.long)
+    for i, ids in enumerate(label_ids):
+        inputs[i, : len(ids) - 1] = torch.tensor(ids[:-1])
+        targets[i, : len(ids) - 1] = torch.tensor(ids[1:])
+        label_mask[i, : len(ids) - 1] = 1
+    inputs, targets, label_mask = (
+        t.repeat(n, 1).to(device) for t in (inputs, targets, label_mask)
+    )
+
+    # Legacy ((key, value), ...) tuples: GPT-2 in the pinned transformers does
+    # not accept Cache objects.
+    cache = tuple(
+        tuple(t.repeat_interleave(num_labels, dim=0) for t in layer)
+        for layer in out.past_key_values
+    )
+    prefix_lengths = mask.sum(-1).repeat_interleave(num_labels)
+    tail = model(
+        input_ids=inputs,
+        attention_mask=torch.cat(
+            [mask.repeat_interleave(num_labels, dim=0), label_mask], dim=1
+        ),
+        position_ids=prefix_lengths[:, None] + torch.arange(tail_len, device=device),
+        past_key_values=cache,
+        use_cache=True,
+    )
+    token_scores = (
+        tail.logits.float().log_softmax(-1).gather(-1, targets[..., None])[..., 0]
+    )
+    return scores + (token_scores * label_mask).sum(-1).view(n, num_labels)
+
+
+def get_content_free_scores(tokenizer, model) -> torch.Tensor:
+    """Label log-likelihoods for the content-free prompt, cached per model."""
+    cached = _content_free_scores.get(model)
+    if cached is None:
+        prompt = build_prompt(tokenizer, CONTENT_FREE_TEXT)
+        cached = label_log_likelihoods(tokenizer, model, [prompt])[0]
+        _content_free_scores[model] = cached
+    return cached
+
+
+def score_emotions(
+    texts: list[str], batch_size: int = SCORE_BATCH_SIZE
+) -> list[dict[str, float]]:
+    """
+    Calibrated probability of each EmotionType label for every transcript.
+    Label likelihoods are divided by those of a content-free prompt
+    (contextual calibration) before normalising over the seven labels.
+    """
+    tokenizer, model = model_cache.get(EMOTION_LLM)
+    bias = get_content_free_scores(tokenizer, model)
+    results = []
+    for i in range(0, len(texts), batch_size):
+        prompts = [build_prompt(tokenizer, text) for text in texts[i : i + batch_size]]
+        scores = label_log_likelihoods(tokenizer, model, prompts) - bias
+        for probs in scores.softmax(-1).tolist():
+            results.append({str(label): p for label, p in zip(LABELS, probs)})
+    return results
+
+
+def emotional_detection(transcript: dict, mode: str = "score") -> str:
+    """
+    Detect the speaker's emotion. The default "score" mode returns the most
+    likely EmotionType label; "generate" samples a free-form answer.
+    """
     job = get_current_job()
     t0 = time.time()
     text = transcript.get("text", transcript)
     logger.info(f"LLM emotion-detect for: {text!r}")
 
-    prompt = f"Given the following transcript, identify the speaker's emotion:\n{text}\nEmotion:"
+    if mode == "score":
+        job.meta["step"] = "scoring"
+        job.save_meta()
+        scores = score_emotions([text])[0]
+        emotion = max(scores, key=scores.get)
+
+        job.meta["step"] = "done"
+        job.meta["emotion"] = emotion
+        job.meta["scores"] = scores
+        job.meta["elapsed_s"] = time.time() - t0
+        job.save_meta()
+
+        logger.info(f"Detected emotion: {emotion}")
+        return emotion
+
+    tokenizer, model = model_cache.get(EMOTION_LLM)
+    gen_config = GenerationConfig(
+        do_sample=True,
+        temperature=0.7,
+        top_p=0.8,
+        eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=tokenizer.eos_token_id,
+    )
+    prompt = build_prompt(tokenizer, text)
 
     job.meta["step"] = "tokenizing"
     job.save_meta()
-    inputs = tokenizer(prompt, return_tensors="pt", truncation=True, max_length=512)
+    inputs = tokenizer(prompt, return_tensors="pt")
     inputs = {k: v.to(device) for k, v in inputs.items()}
 
     job.meta["step"] = "generating"
@@ -54,8 +208,8 @@ def emotional_detection(transcript: dict) -> str:
 
     job.meta["step"] = "decoding"
     job.save_meta()
-    decoded = tokenizer.decode(out[0], skip_special_tokens=True)
-    emotion = decoded[len(prompt) :].strip()
+    new_tokens = out[0][inputs["input_ids"].shape[1] :]
+    emotion = tokenizer.decode(new_tokens, skip_special_tokens=True).strip()
 
     job.meta["step"] = "done"
     job.meta["emotion"] = emotion
@@ -0,0 +1,202 @@
+"""
+Bulk export of segment-level results to Parquet or Arrow IPC.
+
+    python -m src.export -o segments.parquet --status completed
+"""
+
+import argparse
+from itertools import chain
+from typing import BinaryIO, Iterator
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.api.config import get_logger
+from src.api.schemas import ExportFormat, FaceEmotions, VideoStage, VideoStatus
+from src.mongodb import (
+    build_videos_filter,
+    emotion_detection_collection,
+    emotion_segments_collection,
+    segment_to_document,
+)
+
+logger = get_logger()
+
+EXPORT_BATCH_ROWS = 10_000
+# Videos whose segments are fetched per query.
+EXPORT_VIDEO_BATCH = 500
+
+VAD_COLUMNS = ("arousal", "dominance", "valence")
+FACE_COLUMNS = tuple(f"face_{k}" for k in FaceEmotions.model_fields)
+
+SEGMENT_SCHEMA = pa.schema(
+    [
+        ("video_id", pa.string()),
+        ("video_filename", pa.string()),
+        ("segment_index", pa.int32()),
+        ("start", pa.float64()),
+        ("end", pa.float64()),
+        ("text", pa.string()),
+        # Plain strings: per-batch dictionaries cannot be written to an IPC
+        # file, and Parquet dictionary-encodes the column anyway.
+        ("emotion", pa.string()),
+        ("emotion_score", pa.float64()),
+        *((name, pa.float64()) for name in VAD_COLUMNS),
+        *((name, pa.float64()) for name in FACE_COLUMNS),
+    ]
+)
+
+SEGMENT_PROJECTION = {
+    "_id": 0,
+    "video_id": 1,
+    "index": 1,
+    "start": 1,
+    "end": 1,
+    "text": 1,
+    "emotion": 1,
+    "emotion_score": 1,
+    "vad_score": 1,
+    "face_emotions": 1,
+}
+
+MEDIA_TYPES = {
+    ExportFormat.PARQUET: "application/vnd.apache.parquet",
+    ExportFormat.ARROW: "application/vnd.apache.arrow.file",
+}
+
+
+def _segment_row(doc: dict, filename: str) -> dict:
+    vad = doc.get("vad_score") or {}
+    face = doc.get("face_emotions") or {}
+    return {
+        "video_id": doc["video_id"],
+        "video_filename": filename,
+        "segment_index": doc["index"],
+        "start": doc["start"],
+        "end": doc["end"],
+        "text": doc.get("text"),
+        "emotion": doc.get("emotion"),
+        "emotion_score": doc.get("emotion_score"),
+        **{name: vad.get(name) for name in VAD_COLUMNS},
+        **{f"face_{k}": face.get(k) for k in FaceEmotions.model_fields},
+    }
+
+
+# Records from before the segments collection keep their segments inline.
+INLINE_FLAG = {"$gt": [{"$size": {"$ifNull": ["$emotion_chunks", []]}}, 0]}
+
+
+def _video_batches(query: dict) -> Iterator[tuple[dict[str, str], list[str]]]:
+    """
+    Matching videos as ({id: filename}, ids with inline segments),
+    EXPORT_VIDEO_BATCH at a time.
+    """
+    cursor = emotion_detection_collection.find(
+        query, {"_id": 1, "video_filename": 1, "inline": INLINE_FLAG}
+    ).sort("_id", 1)
+    batch, inline = {}, []
+    for doc in cursor:
+        batch[doc["_id"]] = doc["video_filename"]
+        if doc["inline"]:
+            inline.append(doc["_id"])
+        if len(batch) == EXPORT_VIDEO_BATCH:
+            yield batch, inline
+            batch, inline = {}, []
+    if batch:
+        yield batch, inline
+
+
+def _inline_segment_docs(video_ids: list[str]) -> Iterator[dict]:
+    """Segment documents built from legacy inline emotion_chunks arrays."""
+    cursor = emotion_detection_collection.find(
+        {"_id": {"$in": video_ids}}, {"emotion_chunks": 1}
+    ).sort("_id", 1)
+    for rec in cursor:
+        for i, seg in enumerate(rec.get("emotion_chunks") or []):
+            yield segment_to_document(rec["_id"], i, seg)
+
+
+def iter_segment_batches(
+    query: dict, batch_rows: int = EXPORT_BATCH_ROWS
+) -> Iterator[pa.RecordBatch]:
+    """
+    Record batches of at most `batch_rows` segments for the videos matching
+    `query`, streamed from Mongo cursors so memory does not grow with the
+    number of videos exported.
+    """
+    rows = []
+    for videos, inline in _video_batches(query):
+        legacy = set(inline)
+        stored = [v for v in videos if v not in legacy]
+        cursor = (
+            emotion_segments_collection.find(
+                {"video_id": {"$in": stored}}, SEGMENT_PROJECTION
+            )
+            .sort([("video_id", 1), ("index", 1)])
+            .batch_size(batch_rows)
+        )
+        docs = chain(cursor, _inline_segment_docs(inline)) if inline else cursor
+        for doc in docs:
+            rows.append(_segment_row(doc, videos[doc["video_id"]]))
+            if len(rows) == batch_rows:
+                yield pa.RecordBatch.from_pylist(rows, schema=SEGMENT_SCHEMA)
+                rows = []
+    if rows:
+        yield pa.RecordBatch.from_pylist(rows, schema=SEGMENT_SCHEMA)
+
+
+def write_segments(
+    sink: str | BinaryIO,
+    query: dict,
+    fmt: ExportFormat = ExportFormat.PARQUET,
+    batch_rows: int = EXPORT_BATCH_ROWS,
+) -> int:
+    """Write the segments of the matching videos to `sink`; returns the row count."""
+    if fmt == ExportFormat.PARQUET:
+        writer = pq.ParquetWriter(sink, SEGMENT_SCHEMA, compression="zstd")
+    else:
+        writer = pa.ipc.new_file(sink, SEGMENT_SCHEMA)
+    total = 0
+    with writer:
+        for batch in iter_segment_batches(query, batch_rows):
+            writer.write_batch(batch)
+            total += batch.num_rows
+    logger.info(f"Exported {total} segments as {fmt}")
+    return total
+
+
+def build_export_query(
+    status: VideoStatus | None = None,
+    stage: VideoStage | None = None,
+    video_ids: list[str] | None = None,
+) -> dict:
+    query = build_videos_filter(status, stage)
+    if video_ids:
+        query["_id"] = {"$in": video_ids}
+    return query
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-o", "--output", required=True, help="Output file path")
+    parser.add_argument(
+        "--format",
+        type=ExportFormat,
+        choices=list(ExportFormat),
+        default=ExportFormat.PARQUET,
+    )
+    parser.add_argument("--status", type=VideoStatus, choices=list(VideoStatus))
+    parser.add_argument("--stage", type=VideoStage, choices=list(VideoStage))
+    parser.add_argument(
+        "--video-id", action="append", dest="video_ids", help="Repeatable"
+    )
+    parser.add_argument("--batch-rows", type=int, default=EXPORT_BATCH_ROWS)
+    args = parser.parse_args()
+
+    query = build_export_query(args.status, args.stage, args.video_ids)
+    rows = write_segments(args.output, query, args.format, args.batch_rows)
+    print(f"Wrote {rows} segments to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,69 @@ import tempfile
 import time
 from typing import List, Tuple
 
+import numpy as np
+import soundfile as sf
 from moviepy import VideoFileClip
-from pydub import AudioSegment
 
-from src.api.config import get_logger
+from src.api.config import AUDIO_STORAGE_CODEC, get_logger
 from src.api.schemas import AudioChunk
+from src.pcm_audio import open_pcm_audio
 
 logger = get_logger()
 
+# Storage codec -> (soundfile format, subtype, file extension).
+AUDIO_CODECS = {
+    "flac": ("FLAC", "PCM_16", ".flac"),
+    "opus": ("OGG", "OPUS", ".opus"),
+    "wav": ("WAV", "PCM_16", ".wav"),
+}
+TRANSCODE_BLOCK_FRAMES = 1 << 16
+
+if AUDIO_STORAGE_CODEC not in AUDIO_CODECS:
+    raise ValueError(
+        f"AUDIO_STORAGE_CODEC must be one of {sorted(AUDIO_CODECS)}, "
+        f"got {AUDIO_STORAGE_CODEC!r}"
+    )
+
+
+def audio_extension(codec: str = AUDIO_STORAGE_CODEC) -> str:
+    return AUDIO_CODECS[codec][2]
+
+
+def write_audio(
+    path: str, samples: np.ndarray, sample_rate: int, codec: str = AUDIO_STORAGE_CODEC
+) -> None:
+    fmt, subtype, _ = AUDIO_CODECS[codec]
+    sf.write(path, samples, sample_rate, format=fmt, subtype=subtype)
+
+
+def transcode_audio(
+    src_path: str, dst_path: str, codec: str = AUDIO_STORAGE_CODEC
+) -> str:
+    """
+    Re-encode an audio file with the storage codec, block by block so memory
+    does not grow with the recording's length.
+    """
+    start_time = time.time()
+    fmt, subtype, _ = AUDIO_CODECS[codec]
+    with (
+        sf.SoundFile(src_path) as src,
+        sf.SoundFile(
+            dst_path,
+            "w",
+            samplerate=src.samplerate,
+            channels=src.channels,
+            format=fmt,
+            subtype=subtype,
+        ) as dst,
+    ):
+        for block in src.blocks(blocksize=TRANSCODE_BLOCK_FRAMES, dtype="int16"):
+            dst.write(block)
+    logger.info(
+        f"Transcoded {src_path} to {codec} in {time.time() - start_time:.2f} seconds"
+    )
+    return dst_path
+
 
 def extract_audio_from_video(video_file_path: str, output_audio_path: str) -> str:
     """
@@ -33,40 +88,31 @@ def extract_audio_from_video(video_file_path: str, output_audio_path: str) -> st
 def break_audio_into_chunks(
     audio_file_path: str,
     timestamps: List[Tuple[float, float]],
+    codec: str = AUDIO_STORAGE_CODEC,
 ) -> List[AudioChunk]:
     """
-    Splits a WAV at 16 kHz, 16-bit into sub-clips given by (start_s, end_s) in seconds.
+    Splits the extracted 16 kHz audio into 16-bit mono sub-clips given by
+    (start_s, end_s) in seconds, each encoded with `codec`. Clips are sliced
+    from a memory-mapped PCM copy rather than a fully decoded track.
     Returns a list of AudioChunk models.
     """
     start_time = time.time()
-    audio = (
-        AudioSegment.from_file(audio_file_path)
-        .set_frame_rate(16000)
-        .set_sample_width(2)
-        .set_channels(1)
-    )
-
     chunks: List[AudioChunk] = []
-    for i, (t0, t1) in enumerate(timestamps):
-        start_ms = int(t0 * 1000)
-        end_ms = int(t1 * 1000)
-        segment = audio[start_ms:end_ms]
-
-        tmp = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
-        tmp.close()
-        segment.export(
-            tmp.name,
-            format="wav",
-            parameters=["-ar", "16000", "-ac", "1", "-sample_fmt", "s16"],
-        )
-
-        chunks.append(
-            AudioChunk(
-                filename=tmp.name,
-                start=t0,
-                end=t1,
+    with open_pcm_audio(audio_file_path) as audio:
+        for t0, t1 in timestamps:
+            tmp = tempfile.NamedTemporaryFile(
+                suffix=audio_extension(codec), delete=False
+            )
+            tmp.close()
+            write_audio(tmp.name, audio.pcm(t0, t1), audio.sample_rate, codec)
+
+            chunks.append(
+                AudioChunk(
+                    filename=tmp.name,
+                    start=t0,
+                    end=t1,
+                )
             )
-        )
 
     elapsed = time.time() - start_time
     logger.info(f"Audio chunking completed in {elapsed:.2f} seconds")
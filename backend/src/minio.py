@@ -1,7 +1,14 @@
 import io
 import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
+from typing import BinaryIO, Callable, Iterable, Iterator
 from botocore.client import Config
 import boto3
+from boto3.s3.transfer import TransferConfig
 
 from src.api.config import (
     MINIO_ENDPOINT,
@@ -10,12 +17,26 @@ from src.api.config import (
     REGION_NAME,
     SIGNATURE_VERSION,
     DEFAULT_BUCKET_NAME,
+    MINIO_MAX_POOL_CONNECTIONS,
+    MINIO_MULTIPART_THRESHOLD_MB,
+    MINIO_MULTIPART_CHUNKSIZE_MB,
+    MINIO_TRANSFER_CONCURRENCY,
+    MINIO_BULK_WORKERS,
 )
 
 logger = logging.getLogger(__name__)
 
+# Most keys a single DeleteObjects request accepts.
+DELETE_BATCH_SIZE = 1000
+MB = 1024 * 1024
+
 
 class MinioClient:
+    """
+    S3 client for MinIO. Any S3-compatible endpoint works, so a local
+    stand-in (e.g. `moto_server`) can be passed as `endpoint` in tests.
+    """
+
     def __init__(
         self,
         endpoint: str = MINIO_ENDPOINT,
@@ -24,20 +45,36 @@ class MinioClient:
         region_name: str = REGION_NAME,
         signature_version: str = SIGNATURE_VERSION,
         bucket_name: str = DEFAULT_BUCKET_NAME,
+        max_pool_connections: int = MINIO_MAX_POOL_CONNECTIONS,
+        transfer_config: TransferConfig | None = None,
+        bulk_workers: int = MINIO_BULK_WORKERS,
     ):
         self.bucket_name = bucket_name
+        self.bulk_workers = bulk_workers
+        self.transfer_config = transfer_config or TransferConfig(
+            multipart_threshold=MINIO_MULTIPART_THRESHOLD_MB * MB,
+            multipart_chunksize=MINIO_MULTIPART_CHUNKSIZE_MB * MB,
+            max_concurrency=MINIO_TRANSFER_CONCURRENCY,
+        )
         self.s3 = boto3.client(
             "s3",
             endpoint_url=endpoint,
             aws_access_key_id=access_key,
             aws_secret_access_key=secret_key,
-            config=Config(signature_version=signature_version),
+            config=Config(
+                signature_version=signature_version,
+                max_pool_connections=max_pool_connections,
+            ),
             region_name=region_name,
         )
+        # Buckets known to exist, so uploads skip the HEAD request.
+        self._known_buckets: set[str] = set()
+        self._bucket_lock = threading.Lock()
         logger.info(
-            "MinIO client configured: endpoint=%s bucket=%s",
+            "MinIO client configured: endpoint=%s bucket=%s pool=%d",
             endpoint,
             bucket_name,
+            max_pool_connections,
         )
 
     def bucket_exists(self, bucket: str) -> bool:
@@ -63,17 +100,155 @@ class MinioClient:
                 logger.exception("Could not create bucket %s", bucket)
                 raise
 
+    def ensure_bucket(self, bucket: str) -> None:
+        """Create the bucket if needed; checked once per client and bucket."""
+        if bucket in self._known_buckets:
+            return
+        with self._bucket_lock:
+            if bucket not in self._known_buckets:
+                self.create_bucket(bucket)
+                self._known_buckets.add(bucket)
+
     def upload_fileobj(self, fileobj, bucket: str, key: str):
-        if not self.bucket_exists(bucket):
-            self.create_bucket(bucket)
+        self.ensure_bucket(bucket)
 
         try:
-            self.s3.upload_fileobj(Fileobj=fileobj, Bucket=bucket, Key=key)
+            self.s3.upload_fileobj(
+                Fileobj=fileobj, Bucket=bucket, Key=key, Config=self.transfer_config
+            )
             logger.info("Uploaded %s to %s/%s", key, bucket, key)
         except Exception:
             logger.exception("Upload failed for %s/%s", bucket, key)
             raise
 
+    def upload_file(self, path: str, bucket: str, key: str):
+        self.ensure_bucket(bucket)
+
+        try:
+            self.s3.upload_file(
+                Filename=path, Bucket=bucket, Key=key, Config=self.transfer_config
+            )
+            logger.info("Uploaded %s to %s/%s", path, bucket, key)
+        except Exception:
+            logger.exception("Upload failed for %s/%s", bucket, key)
+            raise
+
+    def download_to_path(self, bucket: str, key: str, path: str) -> str:
+        """Stream the object to `path` in chunks, never holding it in memory."""
+        self.s3.download_file(
+            Bucket=bucket, Key=key, Filename=path, Config=self.transfer_config
+        )
+        return path
+
+    def download_fileobj(self, bucket: str, key: str, fileobj: BinaryIO) -> None:
+        """Stream the object into a writable binary sink in chunks."""
+        self.s3.download_fileobj(
+            Bucket=bucket, Key=key, Fileobj=fileobj, Config=self.transfer_config
+        )
+
+    def download_to_tempfile(
+        self, bucket: str, key: str, suffix: str | None = None
+    ) -> str:
+        """
+        Stream the object to a new temporary file and return its path; the
+        caller removes it. The suffix defaults to the key's extension so
+        ffmpeg and soundfile can recognise the format.
+        """
+        if suffix is None:
+            suffix = os.path.splitext(key)[1]
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        os.close(fd)
+        try:
+            return self.download_to_path(bucket, key, path)
+        except Exception:
+            os.remove(path)
+            raise
+
+    def _run_many(
+        self,
+        fn: Callable[..., object],
+        items: list[tuple],
+        keys: list[str],
+        on_complete: Callable[[str], None] | None,
+    ) -> None:
+        if not items:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.bulk_workers, len(items))) as ex:
+            futures = {ex.submit(fn, *item): key for item, key in zip(items, keys)}
+            for future in as_completed(futures):
+                future.result()
+                if on_complete:
+                    on_complete(futures[future])
+
+    def upload_many(
+        self,
+        bucket: str,
+        items: Iterable[tuple[str | BinaryIO, str]],
+        on_complete: Callable[[str], None] | None = None,
+    ) -> list[str]:
+        """
+        Upload (path or file object, key) pairs in parallel on a thread pool of
+        `bulk_workers`. `on_complete(key)` is called in the caller's thread as
+        each one finishes; the first failure is raised. Returns the keys.
+        """
+        items = list(items)
+        self.ensure_bucket(bucket)
+
+        def upload(src: str | BinaryIO, key: str) -> None:
+            if isinstance(src, str):
+                self.upload_file(src, bucket, key)
+            else:
+                self.upload_fileobj(src, bucket, key)
+
+        keys = [key for _, key in items]
+        self._run_many(upload, items, keys, on_complete)
+        return keys
+
+    def download_many(
+        self,
+        bucket: str,
+        items: Iterable[tuple[str, str]],
+        on_complete: Callable[[str], None] | None = None,
+    ) -> list[str]:
+        """
+        Download (key, path) pairs in parallel, like upload_many. Returns the
+        local paths in the order given.
+        """
+        items = list(items)
+
+        def download(key: str, path: str) -> None:
+            self.download_to_path(bucket, key, path)
+
+        self._run_many(download, items, [key for key, _ in items], on_complete)
+        return [path for _, path in items]
+
     def get_fileobj_in_memory(self, bucket: str, key: str) -> io.BytesIO:
+        """Whole object in memory; only for small objects such as audio chunks."""
         resp = self.s3.get_object(Bucket=bucket, Key=key)
         return io.BytesIO(resp["Body"].read())
+
+    def list_keys(self, bucket: str, prefix: str) -> Iterator[str]:
+        paginator = self.s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                yield obj["Key"]
+
+    def delete_keys(self, bucket: str, keys: Iterable[str]) -> int:
+        """
+        Delete the keys with DeleteObjects, DELETE_BATCH_SIZE per request.
+        Returns how many were deleted; failures are logged.
+        """
+        deleted = 0
+        keys = iter(keys)
+        while batch := list(islice(keys, DELETE_BATCH_SIZE)):
+            resp = self.s3.delete_objects(
+                Bucket=bucket,
+                Delete={"Objects": [{"Key": k} for k in batch], "Quiet": True},
+            )
+            errors = resp.get("Errors", [])
+            for err in errors:
+                logger.error(
+                    "Could not delete %s/%s: %s", bucket, err["Key"], err["Message"]
+                )
+            deleted += len(batch) - len(errors)
+        return deleted
@@ -1,12 +1,53 @@
-from pymongo import MongoClient
+import base64
+import json
+from datetime import datetime, timezone
+
+from pydantic import BaseModel
+from pymongo import DESCENDING, MongoClient, ReplaceOne, UpdateOne
 from src.api.config import MONGODB_URI, MONGODB_DB
+from src.response_cache import invalidate_video
+from src.api.schemas import (
+    FINAL_VIDEO_STAGE,
+    VIDEO_STAGE_FIELDS,
+    EmotionDetectionItem,
+    EmotionSegment,
+    VideoStage,
+    VideoStatus,
+)
 
 client = MongoClient(MONGODB_URI)
 db = client[MONGODB_DB]
 emotion_detection_collection = db.emotion_detection
 emotion_detection_collection.create_index("video_filename", unique=True)
+# Supports the newest-first, cursor-paginated listing.
+emotion_detection_collection.create_index(
+    [("created_at", DESCENDING), ("_id", DESCENDING)]
+)
+# One document per segment, keyed by (video_id, index); a video's segments
+# used to live inline in its emotion_chunks array.
+emotion_segments_collection = db.emotion_segments
+emotion_segments_collection.create_index([("video_id", 1), ("index", 1)], unique=True)
+# Range lookups bound start on both sides; end is in the key so the overlap
+# filter is answered from the index.
+emotion_segments_collection.create_index([("video_id", 1), ("start", 1), ("end", 1)])
+# Per-video emotion summaries and their per-day totals, kept up to date by
+# src.analytics when a pipeline finishes.
+video_rollups_collection = db.video_rollups
+video_rollups_collection.create_index("day")
+daily_rollups_collection = db.daily_rollups
 openai_analysis_collection = db.openai_analysis
 openai_analysis_collection.create_index("video_id", unique=True)
+summary_cache_collection = db.summary_cache
+summary_cache_collection.create_index(
+    [
+        ("video_id", 1),
+        ("model", 1),
+        ("model_revision", 1),
+        ("params_hash", 1),
+        ("prompt_hash", 1),
+    ],
+    unique=True,
+)
 
 
 def check_record_exists(video_filename: str) -> bool:
@@ -24,3 +65,337 @@ def check_video_has_openai_analysis(video_id: str) -> bool:
     Check if a record with the given video ID has an OpenAI analysis.
     """
     return openai_analysis_collection.count_documents({"video_id": video_id}) > 0
+
+
+# Fields left out of the summary listing; they grow with the video length.
+VIDEO_SUMMARY_PROJECTION = {"emotion_chunks": 0, "transcription_result": 0}
+
+
+def encode_video_cursor(doc: dict) -> str:
+    """Opaque cursor pointing just after `doc` in the newest-first listing."""
+    payload = json.dumps([doc["created_at"].isoformat(), str(doc["_id"])])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_video_cursor(cursor: str) -> tuple[datetime, str]:
+    """Inverse of encode_video_cursor; raises ValueError if it is malformed."""
+    try:
+        created_at, video_id = json.loads(base64.urlsafe_b64decode(cursor))
+        return datetime.fromisoformat(created_at), video_id
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def build_videos_filter(
+    status: VideoStatus | None = None, stage: VideoStage | None = None
+) -> dict:
+    """
+    Mongo filter for videos with the given status, or whose latest completed
+    stage is `stage`: its timestamp is set and no later stage's is.
+    """
+    query = {}
+    if status == VideoStatus.COMPLETED:
+        query[VIDEO_STAGE_FIELDS[FINAL_VIDEO_STAGE]] = {"$ne": None}
+    elif status == VideoStatus.PROCESSING:
+        query[VIDEO_STAGE_FIELDS[FINAL_VIDEO_STAGE]] = None
+    if stage is not None:
+        stages = list(VIDEO_STAGE_FIELDS)
+        later = stages[stages.index(stage) + 1 :]
+        # Records from before stage timestamps existed count as uploaded.
+        if stage != VideoStage.VIDEO_UPLOADED:
+            query[VIDEO_STAGE_FIELDS[stage]] = {"$ne": None}
+        for s in later:
+            query.setdefault(VIDEO_STAGE_FIELDS[s], None)
+    return query
+
+
+def find_videos_page(
+    query: dict,
+    limit: int,
+    cursor: str | None = None,
+    projection: dict | None = None,
+) -> tuple[list[dict], str | None]:
+    """
+    One page of videos matching `query`, newest first, and the cursor for the
+    next page (None on the last page). Keyset pagination on (created_at, _id)
+    keeps each page an index range scan however deep the client pages.
+    """
+    page_query = query
+    if cursor is not None:
+        created_at, video_id = decode_video_cursor(cursor)
+        after = {
+            "$or": [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "_id": {"$lt": video_id}},
+            ]
+        }
+        page_query = {"$and": [query, after]} if query else after
+
+    docs = list(
+        emotion_detection_collection.find(page_query, projection)
+        .sort([("created_at", DESCENDING), ("_id", DESCENDING)])
+        .limit(limit + 1)
+    )
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, encode_video_cursor(docs[-1])
+
+
+SEGMENT_BASE_FIELDS = ("timestamp", "text", "emotion", "emotion_score")
+# Video field holding its longest segment's duration, which bounds how far
+# before a window's start an overlapping segment can begin.
+MAX_SEGMENT_DURATION_FIELD = "max_segment_duration"
+SEGMENT_OPTIONAL_FIELDS = ("vad_score", "face_emotions", "audio_chunk_file_path")
+
+
+def segment_to_document(video_id: str, index: int, segment: BaseModel | dict) -> dict:
+    if isinstance(segment, BaseModel):
+        doc = segment.model_dump(exclude_none=True)
+    else:
+        doc = {k: v for k, v in segment.items() if v is not None}
+    start, end = doc.pop("timestamp")
+    return {"video_id": video_id, "index": index, "start": start, "end": end, **doc}
+
+
+def document_to_segment(doc: dict) -> dict:
+    """Segment document back into the EmotionSegment layout."""
+    seg = {k: v for k, v in doc.items() if k not in ("_id", "video_id", "index")}
+    seg["timestamp"] = (seg.pop("start"), seg.pop("end"))
+    return seg
+
+
+def save_segments(video_id: str, segments: list[BaseModel | dict]) -> None:
+    """
+    Replace the video's stored segments with `segments`, in bulk, and record
+    the longest one's duration on the video for load_segment_documents.
+    """
+    docs = [segment_to_document(video_id, i, seg) for i, seg in enumerate(segments)]
+    ops = [
+        ReplaceOne({"video_id": video_id, "index": doc["index"]}, doc, upsert=True)
+        for doc in docs
+    ]
+    if ops:
+        emotion_segments_collection.bulk_write(ops, ordered=False)
+    emotion_segments_collection.delete_many(
+        {"video_id": video_id, "index": {"$gte": len(segments)}}
+    )
+    emotion_detection_collection.update_one(
+        {"_id": video_id},
+        {
+            "$set": {
+                MAX_SEGMENT_DURATION_FIELD: max(
+                    (doc["end"] - doc["start"] for doc in docs), default=0.0
+                )
+            }
+        },
+    )
+    invalidate_video(video_id)
+
+
+def set_segment_vad_scores(
+    video_id: str, scores: list[tuple[tuple[float, float], BaseModel]]
+) -> None:
+    """
+    Set vad_score on the segments with the given (start, end) timestamps,
+    leaving their other fields alone.
+    """
+    ops = [
+        UpdateOne(
+            {"video_id": video_id, "start": start, "end": end},
+            {"$set": {"vad_score": score.model_dump()}},
+        )
+        for (start, end), score in scores
+    ]
+    if ops:
+        emotion_segments_collection.bulk_write(ops, ordered=False)
+    invalidate_video(video_id)
+
+
+def get_max_segment_duration(video_id: str) -> float | None:
+    rec = emotion_detection_collection.find_one(
+        {"_id": video_id}, {MAX_SEGMENT_DURATION_FIELD: 1}
+    )
+    return rec.get(MAX_SEGMENT_DURATION_FIELD) if rec else None
+
+
+def load_segment_documents(
+    video_id: str,
+    start: float | None = None,
+    end: float | None = None,
+    fields: tuple[str, ...] | None = None,
+    max_duration: float | None = None,
+) -> list[dict]:
+    """
+    Segments overlapping [start, end) in start order, as EmotionSegment
+    dicts. With `fields`, only the base fields and those are read.
+
+    `max_duration` (looked up when not given) bounds start from below, so
+    the lookup is an index range around the window rather than a scan from
+    the video's beginning.
+    """
+    query = {"video_id": video_id}
+    start_range = {}
+    if end is not None:
+        start_range["$lt"] = end
+    if start is not None:
+        query["end"] = {"$gt": start}
+        if max_duration is None:
+            max_duration = get_max_segment_duration(video_id)
+        if max_duration is not None:
+            start_range["$gte"] = start - max_duration
+    if start_range:
+        query["start"] = start_range
+    projection = None
+    if fields is not None:
+        projection = {"_id": 0, "start": 1, "end": 1}
+        projection.update(
+            {f: 1 for f in (*SEGMENT_BASE_FIELDS, *fields) if f != "timestamp"}
+        )
+    cursor = emotion_segments_collection.find(query, projection).sort("start", 1)
+    return [document_to_segment(doc) for doc in cursor]
+
+
+def load_segment_documents_for_videos(video_ids: list[str]) -> dict[str, list[dict]]:
+    """Segments of several videos in one query, grouped by video id."""
+    grouped: dict[str, list[dict]] = {}
+    cursor = emotion_segments_collection.find({"video_id": {"$in": video_ids}}).sort(
+        [("video_id", 1), ("start", 1)]
+    )
+    for doc in cursor:
+        grouped.setdefault(doc["video_id"], []).append(document_to_segment(doc))
+    return grouped
+
+
+def load_segments(video_id: str) -> list[EmotionSegment]:
+    return [EmotionSegment.model_validate(d) for d in load_segment_documents(video_id)]
+
+
+def delete_segments(video_id: str) -> None:
+    emotion_segments_collection.delete_many({"video_id": video_id})
+    invalidate_video(video_id)
+
+
+def get_item(video_id: str, with_segments: bool = True) -> EmotionDetectionItem | None:
+    """
+    Load the video record with its segments. Records written before the
+    segments collection existed keep theirs inline and are read as-is.
+    """
+    rec = emotion_detection_collection.find_one({"_id": video_id})
+    if not rec:
+        return None
+    if not with_segments:
+        rec.pop("emotion_chunks", None)
+    else:
+        segments = load_segment_documents(video_id)
+        if segments:
+            rec["emotion_chunks"] = segments
+    return EmotionDetectionItem.model_validate(rec)
+
+
+def save_item(edi: EmotionDetectionItem, with_segments: bool = False) -> None:
+    """
+    Store the record's fields, and with `with_segments` its emotion_chunks
+    in the segments collection (dropping any legacy inline copy).
+    """
+    doc = edi.as_document()
+    doc.pop("emotion_chunks", None)
+    update = {"$set": doc}
+    if with_segments:
+        save_segments(edi.id, edi.emotion_chunks or [])
+        update["$unset"] = {"emotion_chunks": ""}
+    emotion_detection_collection.update_one({"_id": edi.id}, update)
+    invalidate_video(edi.id)
+
+
+def mark_processing_finished(video_id: str) -> None:
+    emotion_detection_collection.update_one(
+        {"_id": video_id},
+        {
+            "$set": {"processing_finished_at": datetime.now(timezone.utc)},
+            "$unset": {"processing_failed_at": "", "processing_error": ""},
+        },
+    )
+    invalidate_video(video_id)
+
+
+def mark_processing_failed(video_id: str, error: str) -> None:
+    emotion_detection_collection.update_one(
+        {"_id": video_id},
+        {
+            "$set": {
+                "processing_failed_at": datetime.now(timezone.utc),
+                "processing_error": error,
+            }
+        },
+    )
+    invalidate_video(video_id)
+
+
+def find_segments_in_range(
+    video_id: str,
+    start: float | None = None,
+    end: float | None = None,
+    fields: tuple[str, ...] = (),
+) -> list[dict] | None:
+    """
+    Emotion segments of the video overlapping [start, end), reduced to the
+    base fields plus the requested optional `fields`. Returns None if the
+    video does not exist.
+    """
+    rec = emotion_detection_collection.find_one(
+        {"_id": video_id},
+        {
+            "inline": {"$gt": [{"$size": {"$ifNull": ["$emotion_chunks", []]}}, 0]},
+            MAX_SEGMENT_DURATION_FIELD: 1,
+        },
+    )
+    if rec is None:
+        return None
+    if rec["inline"]:
+        return _find_inline_segments_in_range(video_id, start, end, fields)
+    return load_segment_documents(
+        video_id, start, end, fields, rec.get(MAX_SEGMENT_DURATION_FIELD)
+    )
+
+
+def _find_inline_segments_in_range(
+    video_id: str,
+    start: float | None,
+    end: float | None,
+    fields: tuple[str, ...],
+) -> list[dict]:
+    """find_segments_in_range for legacy records with inline segments."""
+    seg_start = {"$arrayElemAt": ["$$seg.timestamp", 0]}
+    seg_end = {"$arrayElemAt": ["$$seg.timestamp", 1]}
+    overlap = []
+    if end is not None:
+        overlap.append({"$lt": [seg_start, end]})
+    if start is not None:
+        overlap.append({"$gt": [seg_end, start]})
+
+    pipeline = [
+        {"$match": {"_id": video_id}},
+        {
+            "$project": {
+                "_id": 0,
+                "segments": {
+                    "$map": {
+                        "input": {
+                            "$filter": {
+                                "input": {"$ifNull": ["$emotion_chunks", []]},
+                                "as": "seg",
+                                "cond": {"$and": overlap},
+                            }
+                        },
+                        "as": "seg",
+                        "in": {
+                            f: f"$$seg.{f}" for f in (*SEGMENT_BASE_FIELDS, *fields)
+                        },
+                    }
+                },
+            }
+        },
+    ]
+    docs = list(emotion_detection_collection.aggregate(pipeline))
+    return docs[0]["segments"] if docs else []
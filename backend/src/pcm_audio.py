@@ -0,0 +1,187 @@
+"""
+Memory-mapped access to 16-bit PCM WAV audio.
+
+Consumers read (start, end) ranges from a mapped file instead of decoding
+the whole track, so memory stays flat however long the recording is.
+"""
+
+import os
+import struct
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+import numpy as np
+import soundfile as sf
+
+from src.api.config import get_logger
+
+logger = get_logger()
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+# Size a streamed writer leaves in the data header when it cannot seek back.
+UNKNOWN_DATA_SIZE = 0xFFFFFFFF
+DECODE_BLOCK_FRAMES = 1 << 16
+
+
+def parse_wav_header(path: str) -> tuple[int, int, int, int, int, int]:
+    """
+    Walk the RIFF chunks of a WAV file.
+
+    Returns (format_tag, channels, sample_rate, bits_per_sample, data_offset,
+    data_size). Raises ValueError if it is not a WAV file.
+    """
+    with open(path, "rb") as f:
+        head = f.read(12)
+        if len(head) < 12 or head[:4] != b"RIFF" or head[8:] != b"WAVE":
+            raise ValueError(f"{path} is not a RIFF/WAVE file")
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{path} has no data chunk")
+            chunk_id, size = struct.unpack("<4sI", header)
+            if chunk_id == b"fmt ":
+                body = f.read(size)
+                if len(body) < 16:
+                    raise ValueError(f"{path} has a truncated fmt chunk")
+                tag, channels, rate, _, _, bits = struct.unpack("<HHIIHH", body[:16])
+                if tag == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                    tag = struct.unpack("<H", body[24:26])[0]
+                fmt = (tag, channels, rate, bits)
+                f.seek(size % 2, os.SEEK_CUR)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError(f"{path} has no fmt chunk before its data")
+                offset = f.tell()
+                available = os.fstat(f.fileno()).st_size - offset
+                if size in (0, UNKNOWN_DATA_SIZE) or size > available:
+                    size = available
+                return (*fmt, offset, size)
+            else:
+                f.seek(size + size % 2, os.SEEK_CUR)
+
+
+class PcmAudio:
+    """
+    Read-only, memory-mapped view of a 16-bit PCM WAV file. Ranges are in
+    seconds and clamped to the track.
+    """
+
+    def __init__(self, path: str):
+        tag, channels, rate, bits, offset, size = parse_wav_header(path)
+        if tag != WAVE_FORMAT_PCM or bits != 16:
+            raise ValueError(f"{path} is not 16-bit PCM (format {tag}, {bits} bits)")
+        self.path = path
+        self.sample_rate = rate
+        self.channels = channels
+        self.frames = size // (2 * channels)
+        if self.frames:
+            self._samples = np.memmap(
+                path,
+                dtype="<i2",
+                mode="r",
+                offset=offset,
+                shape=(self.frames, channels),
+            )
+        else:
+            self._samples = np.zeros((0, channels), dtype="<i2")
+
+    @property
+    def duration(self) -> float:
+        return self.frames / self.sample_rate
+
+    def _frame(self, t: float) -> int:
+        return min(max(int(round(t * self.sample_rate)), 0), self.frames)
+
+    def _range(self, start: float, end: float | None) -> slice:
+        stop = self.frames if end is None else self._frame(end)
+        return slice(self._frame(start), max(stop, self._frame(start)))
+
+    def pcm(self, start: float = 0.0, end: float | None = None) -> np.ndarray:
+        """Mono int16 samples; a zero-copy view of the mapping for mono files."""
+        block = self._samples[self._range(start, end)]
+        if self.channels == 1:
+            return block[:, 0]
+        return block.mean(axis=1).astype(np.int16)
+
+    def read(self, start: float = 0.0, end: float | None = None) -> np.ndarray:
+        """Mono float32 samples in [-1, 1); only the range is converted."""
+        block = self._samples[self._range(start, end)]
+        mono = block.mean(axis=1, dtype=np.float32)
+        return mono / np.float32(32768)
+
+    def blocks(
+        self,
+        block_seconds: float,
+        start: float = 0.0,
+        end: float | None = None,
+    ) -> Iterator[tuple[float, np.ndarray]]:
+        """(block start time, float32 samples) over [start, end), in fixed blocks."""
+        span = self._range(start, end)
+        step = max(1, int(block_seconds * self.sample_rate))
+        for i in range(span.start, span.stop, step):
+            t0 = i / self.sample_rate
+            t1 = min(i + step, span.stop) / self.sample_rate
+            yield t0, self.read(t0, t1)
+
+    def close(self) -> None:
+        mm = getattr(self._samples, "_mmap", None)
+        self._samples = np.zeros((0, self.channels), dtype="<i2")
+        self.frames = 0
+        if mm is not None:
+            mm.close()
+
+    def __enter__(self) -> "PcmAudio":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def decode_to_pcm_wav(src_path: str, dst_path: str) -> str:
+    """Decode any soundfile-readable audio to 16-bit PCM WAV, block by block."""
+    start_time = time.time()
+    with (
+        sf.SoundFile(src_path) as src,
+        sf.SoundFile(
+            dst_path,
+            "w",
+            samplerate=src.samplerate,
+            channels=src.channels,
+            format="WAV",
+            subtype="PCM_16",
+        ) as dst,
+    ):
+        for block in src.blocks(blocksize=DECODE_BLOCK_FRAMES, dtype="int16"):
+            dst.write(block)
+    logger.info(
+        f"Decoded {src_path} to PCM WAV in {time.time() - start_time:.2f} seconds"
+    )
+    return dst_path
+
+
+@contextmanager
+def open_pcm_audio(path: str) -> Iterator[PcmAudio]:
+    """
+    PcmAudio over `path`. Compressed files (FLAC, Opus) are decoded to a
+    temporary WAV first, which is removed on exit.
+    """
+    tmp_path = None
+    try:
+        try:
+            audio = PcmAudio(path)
+        except ValueError:
+            fd, tmp_path = tempfile.mkstemp(suffix=".wav")
+            os.close(fd)
+            audio = PcmAudio(decode_to_pcm_wav(path, tmp_path))
+        with audio:
+            yield audio
+    finally:
+        if tmp_path:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
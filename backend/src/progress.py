@@ -0,0 +1,97 @@
+"""
+Pipeline progress updates, published as JSON on the `video:{id}` Redis
+channel and relayed to clients by GET /videos/{id}/events. The terminal
+outcome is also stored on the video record for clients that connect later.
+"""
+
+import json
+
+from src.api.schemas import FINAL_VIDEO_STAGE, VideoStage
+from src.mongodb import mark_processing_failed, mark_processing_finished
+from src.redis_client import redis_conn
+
+# Percent of the pipeline's work done by each stage.
+STAGE_WEIGHTS: dict[VideoStage, float] = {
+    VideoStage.VIDEO_UPLOADED: 0,
+    VideoStage.AUDIO_EXTRACTED: 10,
+    VideoStage.TRANSCRIPTION_COMPLETED: 30,
+    VideoStage.TRANSCRIPTION_CHUNKS_EMOTION_COMPLETED: 10,
+    VideoStage.AUDIO_CHUNKS_UPLOADED: 10,
+    VideoStage.AUDIO_CHUNKS_EMOTION_COMPLETED: 15,
+    VideoStage.VIDEO_FACE_RECOGNITION_EMOTION: 25,
+}
+FINISHED = "finished"
+FAILED = "failed"
+TERMINAL_STEPS = (FINISHED, FAILED)
+# Per-segment updates are sent about this many times per stage.
+SEGMENT_UPDATES_PER_STAGE = 20
+
+
+def video_channel(video_id: str) -> str:
+    return f"video:{video_id}"
+
+
+def progress_percent(
+    stage: VideoStage, done: int | None = None, total: int | None = None
+) -> float:
+    """
+    Percent complete once `stage` has finished; with `done` of `total`
+    segments, also counts that share of the following stage.
+    """
+    stages = list(STAGE_WEIGHTS)
+    i = stages.index(stage)
+    percent = sum(STAGE_WEIGHTS[s] for s in stages[: i + 1])
+    if total and i + 1 < len(stages):
+        percent += STAGE_WEIGHTS[stages[i + 1]] * min(done / total, 1.0)
+    return round(percent, 1)
+
+
+def _publish(video_id: str, payload: dict) -> None:
+    redis_conn.publish(video_channel(video_id), json.dumps(payload))
+
+
+def publish_step(
+    video_id: str,
+    step: str,
+    stage: VideoStage,
+    done: int | None = None,
+    total: int | None = None,
+    **meta,
+) -> None:
+    """Publish a step update; `stage` is the latest stage already completed."""
+    payload = {
+        "step": step,
+        "stage": stage,
+        "percent": progress_percent(stage, done, total),
+        **meta,
+    }
+    if total:
+        payload.update(done=done, total=total)
+    _publish(video_id, payload)
+
+
+def publish_segment_progress(
+    video_id: str, step: str, stage: VideoStage, done: int, total: int
+) -> None:
+    """publish_step for per-segment loops, throttled to a few updates per stage."""
+    every = max(1, total // SEGMENT_UPDATES_PER_STAGE)
+    if done % every == 0 or done == total:
+        publish_step(video_id, step, stage, done=done, total=total)
+
+
+def publish_finished(video_id: str, stage: VideoStage = FINAL_VIDEO_STAGE) -> None:
+    """Record the pipeline as finished, then tell subscribers."""
+    # Stored first, so clients that connect later replay it and stop.
+    mark_processing_finished(video_id)
+    _publish(video_id, {"step": FINISHED, "stage": stage, "percent": 100.0})
+
+
+def publish_failed(video_id: str, error: str) -> None:
+    """Record the pipeline as failed, then tell subscribers."""
+    mark_processing_failed(video_id, error)
+    _publish(video_id, {"step": FAILED, "error": error})
+
+
+def publish_job_failure(job, connection, exc_type, exc_value, traceback) -> None:
+    """RQ on_failure callback for pipeline jobs whose first argument is the video id."""
+    publish_failed(job.args[0], f"{exc_type.__name__}: {exc_value}")
@@ -0,0 +1,8 @@
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+
+from src.api.config import REDIS_URL
+
+redis_conn = Redis.from_url(REDIS_URL)
+# For the API's event loop, e.g. pub/sub subscriptions in SSE endpoints.
+async_redis_conn = AsyncRedis.from_url(REDIS_URL)
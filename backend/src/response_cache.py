@@ -0,0 +1,68 @@
+"""
+Redis cache for serialized GET /videos/{id} responses.
+
+Entries are keyed by video id and a per-video generation that every write
+to the video increments. A reader that loaded the document before a write
+stores it under the old generation, where it is never read again, so
+invalidation cannot race with a concurrent cache fill.
+"""
+
+import hashlib
+
+from redis.exceptions import RedisError
+
+from src.api.config import VIDEO_CACHE_TTL_SECONDS, get_logger
+from src.redis_client import redis_conn
+
+logger = get_logger()
+
+# Outlives every entry, so a generation never restarts under a live entry.
+GENERATION_TTL_SECONDS = max(VIDEO_CACHE_TTL_SECONDS * 10, 86400)
+
+
+def _generation_key(video_id: str) -> str:
+    return f"video_cache:{video_id}:generation"
+
+
+def _entry_key(video_id: str, generation: int) -> str:
+    return f"video_cache:{video_id}:{generation}"
+
+
+def make_etag(body: bytes) -> str:
+    return f'"{hashlib.sha1(body).hexdigest()}"'
+
+
+def get_generation(video_id: str) -> int:
+    return int(redis_conn.get(_generation_key(video_id)) or 0)
+
+
+def get_cached_video(video_id: str, generation: int) -> tuple[str, bytes] | None:
+    """The cached (etag, body) for this generation of the video, if any."""
+    entry = redis_conn.hgetall(_entry_key(video_id, generation))
+    if not entry:
+        return None
+    return entry[b"etag"].decode(), entry[b"body"]
+
+
+def cache_video(video_id: str, generation: int, body: bytes) -> str:
+    """Store the serialized response and return its ETag."""
+    etag = make_etag(body)
+    key = _entry_key(video_id, generation)
+    with redis_conn.pipeline() as pipe:
+        pipe.hset(key, mapping={"etag": etag, "body": body})
+        pipe.expire(key, VIDEO_CACHE_TTL_SECONDS)
+        pipe.execute()
+    return etag
+
+
+def invalidate_video(video_id: str) -> None:
+    """Move the video to a new generation; call after every write to it."""
+    key = _generation_key(video_id)
+    try:
+        with redis_conn.pipeline() as pipe:
+            pipe.incr(key)
+            pipe.expire(key, GENERATION_TTL_SECONDS)
+            pipe.execute()
+    except RedisError:
+        # Entries expire on their own; a missed bump only delays freshness.
+        logger.exception(f"[{video_id}]: could not invalidate cached response")
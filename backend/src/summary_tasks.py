@@ -0,0 +1,130 @@
+import asyncio
+import time
+
+from rq import Queue, get_current_job
+from rq.exceptions import NoSuchJobError
+from rq.job import Job, JobStatus
+
+from src.analysis.openai import close_loop_resources, get_or_create_openai_analysis
+from src.analysis.prompt import OPENAI_PROMPT
+from src.analysis.summary_cache import summarize_with_cache
+from src.api.config import PRECOMPUTE_SUMMARIES, get_logger
+from src.api.schemas import EmotionModel, EmotionSegment
+from src.mongodb import get_item
+from src.redis_client import redis_conn
+
+logger = get_logger()
+summary_queue = Queue("summaries", connection=redis_conn, default_timeout=1800)
+
+PENDING_STATUSES = {
+    JobStatus.QUEUED,
+    JobStatus.STARTED,
+    JobStatus.DEFERRED,
+    JobStatus.SCHEDULED,
+}
+
+
+def _load_segments(video_id: str) -> list[EmotionSegment]:
+    edi = get_item(video_id)
+    if not edi:
+        msg = f"No record for video {video_id}"
+        logger.error(msg)
+        raise RuntimeError(msg)
+
+    if not edi.emotion_chunks:
+        msg = f"No emotion segments for video {video_id}"
+        logger.error(msg)
+        raise RuntimeError(msg)
+    return edi.emotion_chunks
+
+
+def local_summary_task(video_id: str, model_name: str) -> dict:
+    start = time.time()
+    job = get_current_job()
+    logger.info(f"[{video_id}]: {model_name} summary task start")
+    job.meta["step"] = "generating_summary"
+    job.save_meta()
+
+    segments = _load_segments(video_id)
+    summary, cached = summarize_with_cache(video_id, EmotionModel(model_name), segments)
+
+    job.meta.update(step="summary_ready", cached=cached, elapsed_s=time.time() - start)
+    job.save_meta()
+    return {
+        "model": model_name,
+        "prompt": summary.prompt,
+        "summary": summary.summary,
+        "cached": cached,
+    }
+
+
+async def _run_openai_analysis(video_id: str):
+    try:
+        return await get_or_create_openai_analysis(video_id)
+    finally:
+        await close_loop_resources()
+
+
+def openai_analysis_task(video_id: str) -> dict:
+    start = time.time()
+    job = get_current_job()
+    logger.info(f"[{video_id}]: openai analysis task start")
+    job.meta["step"] = "requesting_openai"
+    job.save_meta()
+
+    analysis = asyncio.run(_run_openai_analysis(video_id))
+
+    job.meta.update(step="analysis_ready", elapsed_s=time.time() - start)
+    job.save_meta()
+    return analysis.model_dump()
+
+
+def summary_job_id(video_id: str, model_name: str) -> str:
+    return f"summary-{model_name}-{video_id}"
+
+
+def enqueue_summary(video_id: str, model_name: str) -> Job:
+    """
+    Enqueue a summary job for the video, or return the one already pending,
+    so repeated requests share a single job.
+    """
+    job_id = summary_job_id(video_id, model_name)
+    try:
+        job = Job.fetch(job_id, connection=redis_conn)
+        if job.get_status() in PENDING_STATUSES:
+            return job
+    except NoSuchJobError:
+        pass
+
+    if model_name == OPENAI_PROMPT:
+        return summary_queue.enqueue(openai_analysis_task, video_id, job_id=job_id)
+    return summary_queue.enqueue(
+        local_summary_task, video_id, model_name, job_id=job_id
+    )
+
+
+def precompute_summaries_task(video_id: str) -> None:
+    """
+    Generate and cache the local-model summaries configured in
+    PRECOMPUTE_SUMMARIES so the first request for them is a cache hit.
+    """
+    job = get_current_job()
+    job.meta["step"] = "precomputing_summaries"
+    job.save_meta()
+
+    segments = _load_segments(video_id)
+    for model_name in PRECOMPUTE_SUMMARIES:
+        _, cached = summarize_with_cache(video_id, EmotionModel(model_name), segments)
+        logger.info(f"[{video_id}]: {model_name} summary ready (cached={cached})")
+
+    job.meta["step"] = "summaries_precomputed"
+    job.save_meta()
+
+
+def enqueue_summary_precompute(video_id: str, depends_on=None) -> Job | None:
+    """Enqueue precompute_summaries_task if any models are configured for it."""
+    if not PRECOMPUTE_SUMMARIES:
+        return None
+    return summary_queue.enqueue(
+        precompute_summaries_task, video_id, depends_on=depends_on
+    )
@@ -2,83 +2,92 @@ import datetime
 import os
 import tempfile
 import time
-import json
 from rq import get_current_job, Queue
-from redis import Redis
 
 from src.api.config import get_logger
 from src.minio import MinioClient
-from src.mongodb import emotion_detection_collection
-from src.file_processing import break_audio_into_chunks, extract_audio_from_video
+from src.redis_client import redis_conn
+from src.progress import (
+    publish_finished,
+    publish_job_failure,
+    publish_segment_progress,
+    publish_step,
+)
+from src.mongodb import get_item, save_item, set_segment_vad_scores
+from src.file_processing import (
+    audio_extension,
+    break_audio_into_chunks,
+    extract_audio_from_video,
+    transcode_audio,
+)
 from src.analysis.transcript import get_transcript
 from src.analysis.short import emotional_detection_for_each_timestamp
 from src.api.schemas import (
-    EmotionDetectionItem,
     TranscriptionResult,
+    VideoStage,
 )
-from src.analysis.audio_emotion import get_emotion_scores_from_file
+from src.analysis.audio_emotion import get_emotion_scores
+from src.pcm_audio import open_pcm_audio
+from src.summary_tasks import enqueue_summary_precompute
+from src.analytics import update_video_rollup
 
 logger = get_logger()
 minio = MinioClient()
-redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
-redis_conn = Redis.from_url(redis_url)
 queue = Queue("emotion_detection", connection=redis_conn, default_timeout=360)
 
 
-def _publish_step(video_id: str, step: str, **meta):
-    """
-    Helper to publish a JSON step update to Redis pub/sub.
-    """
-    payload = {"step": step, **meta}
-    redis_conn.publish(f"video:{video_id}", json.dumps(payload))
-
-
 def extract_audio_task(video_id: str) -> None:
     start = time.time()
     job = get_current_job()
     logger.info(f"[{video_id}]: extract_audio_task start")
     job.meta["step"] = "extracting_audio"
     job.save_meta()
-    _publish_step(video_id, "extracting_audio")
+    publish_step(video_id, "extracting_audio", VideoStage.VIDEO_UPLOADED)
 
-    rec = emotion_detection_collection.find_one({"_id": video_id})
-    if not rec:
+    edi = get_item(video_id, with_segments=False)
+    if not edi:
         msg = f"No record found for video {video_id}"
         logger.error(msg)
         raise RuntimeError(msg)
 
-    edi = EmotionDetectionItem.model_validate(rec)
-    data = minio.get_fileobj_in_memory(minio.bucket_name, edi.video_object_path).read()
-
-    with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as vf:
-        vf.write(data)
-        video_path = vf.name
+    video_path = minio.download_to_tempfile(
+        minio.bucket_name, edi.video_object_path, suffix=".mp4"
+    )
+    wav_path = stored_path = None
 
     try:
         with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as af:
             wav_path = af.name
         extract_audio_from_video(video_path, wav_path)
 
-        audio_key = f"audio/{video_id}.wav"
-        with open(wav_path, "rb") as wf:
+        ext = audio_extension()
+        with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as tf:
+            stored_path = tf.name
+        transcode_audio(wav_path, stored_path)
+
+        audio_key = f"audio/{video_id}{ext}"
+        with open(stored_path, "rb") as wf:
             minio.upload_fileobj(wf, minio.bucket_name, audio_key)
 
         edi.audio_object_path = audio_key
         edi.audio_extracted_at = datetime.datetime.now(datetime.timezone.utc)
 
-        emotion_detection_collection.update_one(
-            {"_id": video_id}, {"$set": edi.as_document()}
-        )
+        save_item(edi)
 
         elapsed = time.time() - start
         logger.info(f"[{video_id}]: audio extracted in {elapsed:.2f}s → {audio_key}")
 
         job.meta.update(audio_key=audio_key, step="audio_extracted")
         job.save_meta()
-        _publish_step(video_id, "audio_extracted", audio_key=audio_key)
+        publish_step(
+            video_id,
+            "audio_extracted",
+            VideoStage.AUDIO_EXTRACTED,
+            audio_key=audio_key,
+        )
 
     finally:
-        for p in (video_path, wav_path):
+        for p in filter(None, (video_path, wav_path, stored_path)):
             try:
                 os.remove(p)
             except OSError:
@@ -92,37 +101,30 @@ def analyze_audio_task(video_id: str) -> None:
     logger.info(f"[{video_id}]: analyze_audio_task start")
     job.meta["step"] = "analyzing_audio"
     job.save_meta()
-    _publish_step(video_id, "analyzing_audio")
+    publish_step(video_id, "analyzing_audio", VideoStage.AUDIO_EXTRACTED)
 
-    rec = emotion_detection_collection.find_one({"_id": video_id})
-    if not rec:
+    edi = get_item(video_id, with_segments=False)
+    if not edi:
         msg = f"No record for video {video_id}"
         logger.error(msg)
         raise RuntimeError(msg)
 
-    edi = EmotionDetectionItem.model_validate(rec)
     if not edi.audio_object_path:
         msg = f"Missing audio for video {video_id}"
         logger.error(msg)
         raise RuntimeError(msg)
 
-    data = minio.get_fileobj_in_memory(minio.bucket_name, edi.audio_object_path).read()
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as af:
-        af.write(data)
-        wav_path = af.name
+    audio_path = minio.download_to_tempfile(minio.bucket_name, edi.audio_object_path)
 
     try:
-        tr: TranscriptionResult = get_transcript(wav_path)
+        tr: TranscriptionResult = get_transcript(audio_path)
         logger.info(f"[{video_id}]: transcribed in {time.time() - start:.2f}s")
         edi.transcription_completed_at = datetime.datetime.now(datetime.timezone.utc)
         edi.transcription_result = tr.text
-        emotion_detection_collection.update_one(
-            {"_id": video_id},
-            {
-                "$set": edi.as_document(),
-            },
+        save_item(edi)
+        publish_step(
+            video_id, "transcription_completed", VideoStage.TRANSCRIPTION_COMPLETED
         )
-        _publish_step(video_id, "transcription_completed")
 
         chunks = emotional_detection_for_each_timestamp(tr)
         edi.transcription_result = tr.text
@@ -130,18 +132,21 @@ def analyze_audio_task(video_id: str) -> None:
         edi.transcription_chunks_emotion_completed_at = datetime.datetime.now(
             datetime.timezone.utc
         )
-        emotion_detection_collection.update_one(
-            {"_id": video_id}, {"$set": edi.as_document()}
-        )
+        save_item(edi, with_segments=True)
 
         logger.info(f"[{video_id}]: emotions detected ({len(chunks)})")
         job.meta.update(segments=len(chunks), step="emotions_detected")
         job.save_meta()
-        _publish_step(video_id, "emotions_detected", segments=len(chunks))
+        publish_step(
+            video_id,
+            "emotions_detected",
+            VideoStage.TRANSCRIPTION_CHUNKS_EMOTION_COMPLETED,
+            segments=len(chunks),
+        )
 
     finally:
         try:
-            os.remove(wav_path)
+            os.remove(audio_path)
         except OSError:
             pass
         logger.info(f"[{video_id}]: cleaned temp file")
@@ -152,36 +157,58 @@ def chunk_audio_task(video_id: str) -> None:
     logger.info(f"[{video_id}]: chunk_audio_task start")
     job.meta["step"] = "chunking_audio"
     job.save_meta()
-    _publish_step(video_id, "chunking_audio")
+    publish_step(
+        video_id,
+        "chunking_audio",
+        VideoStage.TRANSCRIPTION_CHUNKS_EMOTION_COMPLETED,
+    )
 
-    rec = emotion_detection_collection.find_one({"_id": video_id})
-    if not rec:
+    edi = get_item(video_id)
+    if not edi:
         msg = f"No record for video {video_id}"
         logger.error(msg)
         raise RuntimeError(msg)
 
-    edi = EmotionDetectionItem.model_validate(rec)
     if not edi.audio_object_path or not edi.emotion_chunks:
         msg = f"Incomplete data for video {video_id}"
         logger.error(msg)
         raise RuntimeError(msg)
 
-    data = minio.get_fileobj_in_memory(minio.bucket_name, edi.audio_object_path).read()
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as af:
-        af.write(data)
-        wav_path = af.name
+    audio_path = minio.download_to_tempfile(minio.bucket_name, edi.audio_object_path)
 
     try:
         timestamps = [tuple(seg.timestamp) for seg in edi.emotion_chunks]
-        chunks = break_audio_into_chunks(wav_path, timestamps)
+        chunks = break_audio_into_chunks(audio_path, timestamps)
+
+        uploaded = 0
+
+        def on_uploaded(key: str) -> None:
+            nonlocal uploaded
+            uploaded += 1
+            publish_segment_progress(
+                video_id,
+                "chunking_audio",
+                VideoStage.TRANSCRIPTION_CHUNKS_EMOTION_COMPLETED,
+                uploaded,
+                len(chunks),
+            )
 
-        keys = []
-        for i, c in enumerate(chunks):
-            key = f"audio_chunks/{video_id}/chunk_{i}.wav"
-            with open(c.filename, "rb") as cf:
-                minio.upload_fileobj(cf, minio.bucket_name, key)
-            keys.append(key)
-            os.remove(c.filename)
+        ext = audio_extension()
+        try:
+            keys = minio.upload_many(
+                minio.bucket_name,
+                (
+                    (c.filename, f"audio_chunks/{video_id}/chunk_{i}{ext}")
+                    for i, c in enumerate(chunks)
+                ),
+                on_complete=on_uploaded,
+            )
+        finally:
+            for c in chunks:
+                try:
+                    os.remove(c.filename)
+                except OSError:
+                    pass
 
         updated = []
         for i, seg in enumerate(edi.emotion_chunks):
@@ -191,18 +218,21 @@ def chunk_audio_task(video_id: str) -> None:
 
         edi.audio_chunks_uploaded_at = datetime.datetime.now(datetime.timezone.utc)
         edi.emotion_chunks = updated
-        emotion_detection_collection.update_one(
-            {"_id": video_id}, {"$set": edi.as_document()}
-        )
+        save_item(edi, with_segments=True)
 
         logger.info(f"[{video_id}]: audio chunked ({len(updated)} chunks)")
         job.meta.update(chunks=len(updated), step="audio_chunked")
         job.save_meta()
-        _publish_step(video_id, "audio_chunked", chunks=len(updated))
+        publish_step(
+            video_id,
+            "audio_chunked",
+            VideoStage.AUDIO_CHUNKS_UPLOADED,
+            chunks=len(updated),
+        )
 
     finally:
         try:
-            os.remove(wav_path)
+            os.remove(audio_path)
         except OSError:
             pass
         logger.info(f"[{video_id}]: cleaned temp file")
@@ -213,49 +243,100 @@ def calculate_audio_emotion_scores_task(video_id: str) -> None:
     logger.info(f"[{video_id}]: calculate_emotion_scores_task start")
     job.meta["step"] = "calculating_emotion_scores"
     job.save_meta()
-    _publish_step(video_id, "calculating_emotion_scores")
-    rec = emotion_detection_collection.find_one({"_id": video_id})
-    if not rec:
+    publish_step(
+        video_id, "calculating_emotion_scores", VideoStage.AUDIO_CHUNKS_UPLOADED
+    )
+    edi = get_item(video_id)
+    if not edi:
         msg = f"No record for video {video_id}"
         logger.error(msg)
         raise RuntimeError(msg)
-    edi = EmotionDetectionItem.model_validate(rec)
+
     if not edi.emotion_chunks:
         msg = f"No audio chunks for video {video_id}"
         logger.error(msg)
         raise RuntimeError(msg)
+    if not edi.audio_object_path:
+        msg = f"Missing audio for video {video_id}"
+        logger.error(msg)
+        raise RuntimeError(msg)
     audio_calculations = []
-    for chunk in edi.emotion_chunks:
-        if not chunk.audio_chunk_file_path:
-            logger.warning(
-                f"[{video_id}]: No audio chunk file path for segment {chunk.id}"
-            )
-            continue
-        data = minio.get_fileobj_in_memory(
-            minio.bucket_name, chunk.audio_chunk_file_path
-        ).read()
-        scores = get_emotion_scores_from_file(data)
-        audio_calculations.append(
-            {
-                "chunk_timestamp": chunk.timestamp,
-                "scores": scores,
-            }
-        )
+    vad_scores = []
+    total = len(edi.emotion_chunks)
+    audio_path = minio.download_to_tempfile(minio.bucket_name, edi.audio_object_path)
+    try:
+        with open_pcm_audio(audio_path) as audio:
+            for i, chunk in enumerate(edi.emotion_chunks):
+                publish_segment_progress(
+                    video_id,
+                    "calculating_emotion_scores",
+                    VideoStage.AUDIO_CHUNKS_UPLOADED,
+                    i + 1,
+                    total,
+                )
+                samples = audio.read(*chunk.timestamp)
+                if not samples.size:
+                    logger.warning(
+                        f"[{video_id}]: No audio for segment {chunk.timestamp}"
+                    )
+                    continue
+                scores = get_emotion_scores(samples, audio.sample_rate)
+                vad_scores.append((tuple(chunk.timestamp), scores))
+                audio_calculations.append(
+                    {
+                        "chunk_timestamp": chunk.timestamp,
+                        "scores": scores,
+                    }
+                )
+    finally:
+        try:
+            os.remove(audio_path)
+        except OSError:
+            pass
+    # Only vad_score is written per segment, so fields set by earlier steps
+    # are not overwritten with this job's copy of the segments.
+    set_segment_vad_scores(video_id, vad_scores)
+    edi.audio_chunks_emotion_completed_at = datetime.datetime.now(datetime.timezone.utc)
+    save_item(edi)
     logger.warning(f"[{video_id}]: audio chunk emotion scores calculated")
     logger.warning(audio_calculations)
+    update_video_rollup(video_id)
+    publish_finished(video_id, VideoStage.AUDIO_CHUNKS_EMOTION_COMPLETED)
 
 
 def trigger_video_processing(video_id: str) -> str:
     """
     Enqueue each step in sequence—no parent/orchestrator job.
     Returns the first (extract_audio_task) job's ID, but
-    WebSocket clients subscribe by video_id, not by job_id.
+    progress clients subscribe by video_id (GET /videos/{id}/events).
     """
-    j1 = queue.enqueue(extract_audio_task, video_id, timeout=3600)
-    queue.enqueue(analyze_audio_task, video_id, depends_on=j1, timeout=3600)
-    queue.enqueue(chunk_audio_task, video_id, depends_on=j1, timeout=3600)
-    queue.enqueue(
-        calculate_audio_emotion_scores_task, video_id, depends_on=j1, timeout=3600
+    j1 = queue.enqueue(
+        extract_audio_task,
+        video_id,
+        timeout=3600,
+        on_failure=publish_job_failure,
+    )
+    j2 = queue.enqueue(
+        analyze_audio_task,
+        video_id,
+        depends_on=j1,
+        timeout=3600,
+        on_failure=publish_job_failure,
+    )
+    j3 = queue.enqueue(
+        chunk_audio_task,
+        video_id,
+        depends_on=j2,
+        timeout=3600,
+        on_failure=publish_job_failure,
+    )
+    j4 = queue.enqueue(
+        calculate_audio_emotion_scores_task,
+        video_id,
+        depends_on=j3,
+        timeout=3600,
+        on_failure=publish_job_failure,
     )
+    enqueue_summary_precompute(video_id, depends_on=j4)
     logger.info(f"[{video_id}] triggered pipeline")
     return j1.id
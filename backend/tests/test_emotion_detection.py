@@ -0,0 +1,66 @@
+import torch
+from transformers import BatchEncoding, GPT2Config, GPT2LMHeadModel
+
+from src import emotion_detection
+
+VOCAB_SIZE = 128
+
+
+class CharTokenizer:
+    """One token per character, left-padded like the loaded emotion tokenizer."""
+
+    pad_token_id = 0
+
+    def encode(self, text: str, add_special_tokens: bool = True) -> list[int]:
+        return [ord(c) % VOCAB_SIZE for c in text]
+
+    def __call__(self, texts: list[str], return_tensors: str, padding: bool):
+        rows = [self.encode(t) for t in texts]
+        width = max(len(r) for r in rows)
+        ids = [[self.pad_token_id] * (width - len(r)) + r for r in rows]
+        mask = [[0] * (width - len(r)) + [1] * len(r) for r in rows]
+        return BatchEncoding(
+            {"input_ids": torch.tensor(ids), "attention_mask": torch.tensor(mask)}
+        )
+
+
+def tiny_gpt2() -> GPT2LMHeadModel:
+    torch.manual_seed(0)
+    config = GPT2Config(
+        vocab_size=VOCAB_SIZE, n_positions=256, n_embd=32, n_layer=2, n_head=2
+    )
+    return GPT2LMHeadModel(config).to(emotion_detection.device).eval()
+
+
+@torch.no_grad()
+def uncached_log_likelihood(tokenizer, model, prompt: str, label: str) -> float:
+    prompt_ids = tokenizer.encode(prompt)
+    label_ids = tokenizer.encode(f" {label}", add_special_tokens=False)
+    input_ids = torch.tensor([prompt_ids + label_ids], device=model.device)
+    log_probs = model(input_ids=input_ids).logits[0].float().log_softmax(-1)
+    return sum(
+        log_probs[len(prompt_ids) + i - 1, token].item()
+        for i, token in enumerate(label_ids)
+    )
+
+
+def test_label_log_likelihoods_match_uncached_forward():
+    tokenizer, model = CharTokenizer(), tiny_gpt2()
+    prompts = [
+        emotion_detection.build_prompt(tokenizer, text)
+        for text in ["I can't believe this happened!", "ok"]
+    ]
+
+    scores = emotion_detection.label_log_likelihoods(tokenizer, model, prompts)
+
+    assert scores.shape == (len(prompts), len(emotion_detection.LABELS))
+    expected = torch.tensor(
+        [
+            [
+                uncached_log_likelihood(tokenizer, model, prompt, label)
+                for label in emotion_detection.LABELS
+            ]
+            for prompt in prompts
+        ]
+    )
+    torch.testing.assert_close(scores.cpu(), expected, atol=1e-4, rtol=1e-4)
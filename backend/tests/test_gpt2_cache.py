@@ -0,0 +1,84 @@
+import torch
+from transformers import GPT2Config, GPT2LMHeadModel
+
+from src.analysis import gpt2
+
+VOCAB_SIZE = 128
+
+
+class CharTokenizer:
+    """One token per character, so tests need no downloaded vocabulary."""
+
+    eos_token_id = 0
+
+    def encode(self, text: str, add_special_tokens: bool = True) -> list[int]:
+        return [ord(c) % VOCAB_SIZE for c in text]
+
+    def batch_decode(self, rows, skip_special_tokens: bool = True) -> list[str]:
+        return [" ".join(str(int(t)) for t in row) for row in rows]
+
+
+def tiny_gpt2() -> GPT2LMHeadModel:
+    torch.manual_seed(0)
+    config = GPT2Config(
+        vocab_size=VOCAB_SIZE, n_positions=512, n_embd=32, n_layer=2, n_head=2
+    )
+    model = GPT2LMHeadModel(config).to(gpt2.device).eval()
+    model.config.pad_token_id = CharTokenizer.eos_token_id
+    return model
+
+
+def greedy(model, ids: list[int], new_tokens: int) -> list[int]:
+    input_ids = torch.tensor([ids], device=gpt2.device)
+    with torch.no_grad():
+        out = model.generate(
+            input_ids=input_ids,
+            attention_mask=torch.ones_like(input_ids),
+            max_new_tokens=new_tokens,
+            do_sample=False,
+            pad_token_id=model.config.pad_token_id,
+        )
+    return out[0, len(ids) :].tolist()
+
+
+def test_cached_header_generation_matches_uncached(monkeypatch):
+    tokenizer, model = CharTokenizer(), tiny_gpt2()
+    monkeypatch.setattr(gpt2.model_cache, "get", lambda name: (tokenizer, model))
+    monkeypatch.setattr(gpt2, "GENERATION_KWARGS", {"do_sample": False})
+
+    header_ids, header_cache = gpt2.get_header_cache(tokenizer, model)
+    assert gpt2.get_header_cache(tokenizer, model)[1] is header_cache
+    expanded = gpt2.expand_cache(header_cache, 3)
+    assert expanded[0][0].shape[0] == 3
+    assert header_cache[0][0].shape[0] == 1
+
+    new_tokens = 5
+    timelines = ["a short one", "a somewhat longer timeline window"]
+    expected = []
+    for timeline in timelines:
+        ids = tokenizer.encode(gpt2.HEADER_TEXT + timeline + gpt2.TRAILER_TEXT)
+        expected.append(" ".join(map(str, greedy(model, ids, new_tokens))))
+
+    for timeline, want in zip(timelines, expected):
+        prompt = gpt2.HEADER_TEXT + timeline + gpt2.TRAILER_TEXT
+        text = gpt2.analyze_prompt_with_gpt2(prompt, max_analysis_tokens=new_tokens)
+        assert text.endswith(want)
+
+    # Both windows in one batch, padded after the shared header.
+    batch = [
+        tokenizer.encode(gpt2.HEADER_TEXT + t + gpt2.TRAILER_TEXT) for t in timelines
+    ]
+    input_ids, attention_mask = gpt2.pad_after_prefix(
+        batch, len(header_ids), model.config.pad_token_id
+    )
+    with torch.no_grad():
+        out = model.generate(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            past_key_values=gpt2.expand_cache(header_cache, len(batch)),
+            max_new_tokens=new_tokens,
+            do_sample=False,
+            pad_token_id=model.config.pad_token_id,
+        )
+    got = tokenizer.batch_decode(out[:, input_ids.shape[-1] :])
+    assert got == expected
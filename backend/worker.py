@@ -1,35 +1,46 @@
 # backend/worker.py
+import importlib
 import os
 import time
-import torch
 from redis import Redis
 from rq import Queue, Worker
-from transformers import pipeline
 
 from src.api.config import get_logger
-from src.api.constants import TRANSCRIPT_MODEL
 
 logger = get_logger()
 
-init_start = time.time()
-device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
-logger.info(f"Loading ASR model on device: {device}")
-asr = pipeline(
-    "automatic-speech-recognition",
-    model=TRANSCRIPT_MODEL,
-    chunk_length_s=20,
-    stride_length_s=5,
-    device=device,
-    return_timestamps=True,
-)
-asr.feature_extractor.return_attention_mask = True
-elapsed = time.time() - init_start
-logger.info(f"ASR model loaded in {elapsed:.2f}s")
+# Modules whose import loads the models a queue's jobs need. They are imported
+# once here so every forked job reuses them instead of loading its own copy.
+QUEUE_PRELOADS = {
+    "emotion_detection": "src.tasks",
+}
+
+
+def preload_models(queue_names: list[str]) -> None:
+    for name in queue_names:
+        module = QUEUE_PRELOADS.get(name)
+        if module is None:
+            continue
+        start = time.time()
+        logger.info(f"Preloading {module} for the {name} queue")
+        importlib.import_module(module)
+        logger.info(f"{module} loaded in {time.time() - start:.2f}s")
+
 
 if __name__ == "__main__":
     redis_url = os.getenv("REDIS_URL", "redis://redis:6379")
     conn = Redis.from_url(redis_url)
 
-    q = Queue("emotion_detection", connection=conn, default_timeout=3600)
-    worker = Worker([q], connection=conn)
+    # Run a dedicated summaries worker with RQ_QUEUES=summaries; it does not
+    # load the ASR, audio or face models.
+    queue_names = [
+        name.strip()
+        for name in os.getenv("RQ_QUEUES", "emotion_detection,summaries").split(",")
+        if name.strip()
+    ]
+    preload_models(queue_names)
+    queues = [
+        Queue(name, connection=conn, default_timeout=3600) for name in queue_names
+    ]
+    worker = Worker(queues, connection=conn)
     worker.work()
@@ -4,6 +4,8 @@ import VideoTablePage from "./components/videos/page"
 import type { VideoItem, ProcessingStatus } from "./types"
 import { TranscriptDialog } from "./components/videos/transcriptDialog"
 
+const PAGE_SIZE = 50
+
 function App() {
   const [videos, setVideos] = useState<VideoItem[]>([])
   const [loading, setLoading] = useState(true)
@@ -11,30 +13,34 @@ function App() {
   const [errorMessage, setError] = useState<string | null>(null)
   const [dialogOpen, setDialogOpen] = useState(false)
   const [currentTranscript, setCurrentTranscript] = useState("")
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
 
   const wsRefs = useRef<Record<string, WebSocket>>({})
 
+  const normalizeVideo = (r: any): VideoItem => ({
+    _id: r._id,
+    id: r._id.slice(-5),
+    audio_object: r.audio_object_path,
+    created_at: new Date(r.created_at).toISOString().split("T").join(" ").split(".")[0],
+    emotion_prompt_result: r.emotion_prompt_result,
+    has_transcript: !!r.transcription_completed_at,
+    processing_status: r.processing_status,
+    stage: r.stage,
+    status: r.status,
+    video_filename: r.video_filename,
+    video_object: r.video_object_path,
+  })
+
   const fetchVideos = useCallback(async () => {
     setLoading(true)
     setError(null)
     try {
-      const res = await fetch("http://localhost:8000/videos")
-      if (res.status === 404) { setVideos([]); return }
+      const res = await fetch(`http://localhost:8000/videos?limit=${PAGE_SIZE}`)
+      if (res.status === 404) { setVideos([]); setNextCursor(null); return }
       const json = await res.json()
       if (!res.ok) throw new Error((json.detail as string) || `Error ${res.status}`)
-      const normalized = json.videos.map((r: any) => ({
-        _id: r._id,
-        id: r._id.slice(-5),
-        audio_object: r.audio_object_path,
-        created_at: new Date(r.created_at).toISOString().split("T").join(" ").split(".")[0],
-        emotion_prompt_result: r.emotion_prompt_result,
-        emotions: r.emotion_chunks,
-        transcript: r.transcription_result,
-        processing_status: r.processing_status,
-        video_filename: r.video_filename,
-        video_object: r.video_object_path,
-      }))
-      setVideos(normalized)
+      setVideos(json.videos.map(normalizeVideo))
+      setNextCursor(json.next_cursor ?? null)
     } catch (err: any) {
       setError(err.message)
     } finally {
@@ -42,6 +48,20 @@ function App() {
     }
   }, [])
 
+  const fetchMoreVideos = useCallback(async () => {
+    if (!nextCursor) return
+    try {
+      const params = new URLSearchParams({ limit: String(PAGE_SIZE), cursor: nextCursor })
+      const res = await fetch(`http://localhost:8000/videos?${params}`)
+      const json = await res.json()
+      if (!res.ok) throw new Error((json.detail as string) || `Error ${res.status}`)
+      setVideos(prev => [...prev, ...json.videos.map(normalizeVideo)])
+      setNextCursor(json.next_cursor ?? null)
+    } catch (err: any) {
+      setError(err.message)
+    }
+  }, [nextCursor])
+
   useEffect(() => {
     fetchVideos()
   }, [fetchVideos])
@@ -60,8 +80,9 @@ function App() {
         const res = await fetch(`http://localhost:8000/videos/${rawId}`, {
           method: "DELETE",
         })
-        if (res.status === 204) {
-          await fetchVideos()
+        if (res.status === 202) {
+          // Deletion finishes in the background; drop the row right away.
+          setVideos(prev => prev.filter(v => v._id !== rawId))
         } else {
           const json = await res.json().catch(() => ({}))
           throw new Error(json.detail ?? `Delete failed (${res.status})`)
@@ -73,13 +94,20 @@ function App() {
     [fetchVideos]
   )
 
-  const handleViewTranscript = useCallback((videoId: string) => {
-    const vid = videos.find(v => v._id === videoId)
-    if (vid && vid.transcript) {
-      setCurrentTranscript(vid.transcript)
-      setDialogOpen(true)
+  const handleViewTranscript = useCallback(async (videoId: string) => {
+    // The listing leaves transcripts out; load this one on demand.
+    try {
+      const res = await fetch(`http://localhost:8000/videos/${videoId}`)
+      const json = await res.json()
+      if (!res.ok) throw new Error((json.detail as string) || `Error ${res.status}`)
+      if (json.transcription_result) {
+        setCurrentTranscript(json.transcription_result)
+        setDialogOpen(true)
+      }
+    } catch (err: any) {
+      alert(`Could not load transcript: ${err.message}`)
     }
-  }, [videos])
+  }, [])
 
   useEffect(() => {
     return () => {
@@ -102,6 +130,11 @@ function App() {
           onDelete={handleDelete}
           onViewTranscript={handleViewTranscript}
         />
+        {nextCursor && !loading && (
+          <button className="text-sm underline" onClick={fetchMoreVideos}>
+            Load more
+          </button>
+        )}
         <TranscriptDialog
           open={dialogOpen}
           transcript={currentTranscript}
@@ -25,7 +25,7 @@ export function getVideoColumns(
             header: "⋮",
             cell: ({ row }) => {
                 const v = row.original
-                const canView = !!v.transcript
+                const canView = v.has_transcript
                 return (
                     <DropdownMenu>
                         <DropdownMenuTrigger asChild>
@@ -28,9 +28,10 @@ export type VideoItem = {
     audio_object: string
     created_at: string
     emotion_prompt_result: string
-    emotions: Emotions[]
-    transcript: string
+    has_transcript: boolean
     processing_status: ProcessingStatus
+    stage: string
+    status: "processing" | "completed"
     video_filename: string
     video_object: string
 }